@@ -1,28 +1,40 @@
 import telebot
 import time
 import threading
-import signal
 import os
 import json
-import psutil
+import re
+import html
 import logging
 from modules.config import BOT_TOKEN, ADMIN_ID, ADMIN_IDS, TG_RTMP_URL, ALIST_URL, WIFI_CONFIG, ALERT_CPU, ALERT_MEM
-from modules.utils import SystemUtils, NetworkUtils
+from modules.config import WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_LOCAL, auto_setup_proxy
+from modules.utils import SystemUtils, NetworkUtils, ProcessSampler, status_sampler, process_sampler, escape_md
 from modules.alist import FileManager, AlistUtils
 from modules.menus import get_keyboard
 from modules.monitor import Monitor
-from modules.stream import StreamManager
-import subprocess
+from modules.stream import StreamManager, FFmpegUtils, PlaylistSession, VIDEO_EXTS
+from modules.dispatch import ChatDispatcher
+from modules.router import router
+from modules.outbox import RateLimitedBot
+from modules.webhook import run_webhook
+from modules.search import search_index, index_crawler
+from modules.runner import CommandRunner
+from modules.logs import LogFollower, pm2_tail
 
 # --- 🤖 初始化 ---
-bot = telebot.TeleBot(BOT_TOKEN)
-stream_process = None
+# 网络/代理探测必须在创建 TeleBot 和首次调用 API 之前完成
+auto_setup_proxy()
+bot = RateLimitedBot(BOT_TOKEN)
 start_time = time.time()
 user_states = {} 
+dispatcher = ChatDispatcher(workers=4)
+answer_lock = threading.Lock()
 
-# 启动监控
+# 启动状态采样与监控
+status_sampler.start()
 monitor_system = Monitor(bot)
 monitor_system.start()
+index_crawler.start()
 
 # 设置左下角菜单命令
 try:
@@ -30,6 +42,8 @@ try:
         telebot.types.BotCommand("menu", "打开控制面板"),
         telebot.types.BotCommand("status", "查看系统状态"),
         telebot.types.BotCommand("stream", "直播推流设置"),
+        telebot.types.BotCommand("history", "查看资源历史趋势"),
+        telebot.types.BotCommand("find", "搜索 Alist 文件"),
         telebot.types.BotCommand("help", "显示帮助信息")
     ])
     print("✅ 菜单命令已设置")
@@ -54,24 +68,95 @@ def menu(message):
 def status_handler(message):
     if not is_auth(message): return
     status = SystemUtils.get_status_msg(start_time)
-    bot.reply_to(message, status, parse_mode='Markdown')
+    bot.reply_to(message, f"{status}\n{dispatcher.stats_msg()}\n{bot.stats_msg()}", parse_mode='Markdown')
 
 @bot.message_handler(commands=['stream'])
 def stream_handler(message):
     if not is_auth(message): return
-    bot.send_message(message.chat.id, "📺 **直播控制台**", reply_markup=get_keyboard("stream", stream_process=stream_process), parse_mode='Markdown')
+    bot.send_message(message.chat.id, "📺 **直播控制台**", reply_markup=get_keyboard("stream"), parse_mode='Markdown')
+
+HISTORY_RANGES = {'1h': 3600, '6h': 6 * 3600, '24h': 24 * 3600, '7d': 7 * 24 * 3600}
+
+@bot.message_handler(commands=['history'])
+def history_handler(message):
+    if not is_auth(message): return
+    args = message.text.split(maxsplit=1)
+    label = args[1].strip().lower() if len(args) > 1 else '1h'
+    if label not in HISTORY_RANGES:
+        return bot.reply_to(message, "用法: /history [1h|6h|24h|7d]")
+    bot.reply_to(message, monitor_system.history.render(HISTORY_RANGES[label], label), parse_mode='Markdown')
+
+@bot.message_handler(commands=['find'])
+def find_handler(message):
+    if not is_auth(message): return
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2:
+        st = search_index.stats()
+        done = time.strftime('%m-%d %H:%M', time.localtime(st['completed'])) if st['completed'] else "尚未完成"
+        crawl = f"，索引中 (待遍历 {st['queued']} 个目录)" if st['queued'] else ""
+        return bot.reply_to(message, f"用法: /find <关键词>\n🗂 已索引 {st['files']} 个文件 / {st['dirs']} 个目录，上次完成: {done}{crawl}")
+    query = args[1].strip()
+    started = time.perf_counter()
+    rows = search_index.search(query)
+    elapsed = (time.perf_counter() - started) * 1000
+    if not rows:
+        return bot.reply_to(message, f"🔍 未找到 “{query}” ({elapsed:.0f}ms)")
+    cid = message.chat.id
+    FileManager.show_entries(user_states, cid, [{'name': path.lstrip('/'), 'is_dir': is_dir, 'size': size} for path, is_dir, size in rows])
+    # 旧版 Markdown 的代码段内无法转义反引号，展示时去掉
+    shown = query.replace('`', '')
+    bot.send_message(cid, f"🔍 **搜索结果** `{shown}`: {len(rows)} 条 ({elapsed:.0f}ms)", reply_markup=get_keyboard("fm", user_states, '/', cid), parse_mode='Markdown')
 
 @bot.message_handler(commands=['cmd'])
 def cmd_handler(message):
     if not is_auth(message): return
     cmd = message.text.split(maxsplit=1)
-    if len(cmd) > 1:
-        bot.reply_to(message, f"⏳ 执行: {cmd[1]}...")
-        res = SystemUtils.run_cmd(cmd[1])
-        if len(res) > 3000: res = res[:3000] + "\n...(截断)"
-        bot.reply_to(message, f"```\n{res or '无输出'}\n```", parse_mode='Markdown')
-    else:
-        bot.reply_to(message, "用法: /cmd <命令>")
+    if len(cmd) < 2:
+        return bot.reply_to(message, "用法: /cmd <命令>")
+    cid = message.chat.id
+    runner = CommandRunner(cmd[1], on_update=lambda r: render_cmd(r, cid, mid), on_exit=lambda r: finish_cmd(r, cid, mid))
+    mid = bot.reply_to(message, f"⏳ 执行: <code>{html.escape(cmd[1])}</code>", reply_markup=get_keyboard("cmd_run", data=runner.id), parse_mode='HTML').message_id
+    try:
+        runner.start()
+    except Exception as e:
+        runner.cleanup()
+        bot.edit_message_text(f"❌ 启动失败: {html.escape(str(e))}", cid, mid, parse_mode='HTML')
+
+def pre_text(text, limit=3500):
+    # 输出用 <pre> 包裹，HTML 转义后仍需控制在消息长度限制内 (保留末尾)
+    while len(html.escape(text)) > limit:
+        text = text[len(text) // 4:]
+    return f"<pre>{html.escape(text)}</pre>"
+
+def cmd_text(runner, status):
+    more = "...(仅显示末尾)\n" if runner.truncated else ""
+    return f"{status} <code>{html.escape(runner.cmd)}</code> ({runner.elapsed:.0f}s)\n{pre_text(more + (runner.tail() or '无输出'))}"
+
+def render_cmd(runner, cid, mid):
+    try:
+        bot.edit_message_text(cmd_text(runner, "⏳ 运行中"), cid, mid, reply_markup=get_keyboard("cmd_run", data=runner.id), parse_mode='HTML')
+    except Exception as e:
+        if "message is not modified" not in str(e): raise
+
+def finish_cmd(runner, cid, mid):
+    if runner.timed_out: status = "⏰ 超时已终止"
+    elif runner.cancelled: status = "⏹ 已终止"
+    elif runner.returncode == 0: status = "✅ 完成"
+    else: status = f"❌ 退出码 {runner.returncode}"
+    try:
+        bot.edit_message_text(cmd_text(runner, status), cid, mid, parse_mode='HTML')
+        if runner.truncated:
+            with open(runner.spool_path, 'rb') as f:
+                bot.send_document(cid, f, reply_to_message_id=mid, visible_file_name="output.txt",
+                                  caption=f"📄 完整输出 ({runner.total_bytes // 1024}KB)")
+    finally:
+        runner.cleanup()
+
+@router.prefix("cmd_cancel_", int)
+def on_cmd_cancel(call, cid, mid, run_id):
+    runner = CommandRunner.active.get(run_id)
+    if not runner or not runner.cancel(): return answer(call, "命令已结束")
+    answer(call, "⏹ 已发送终止信号")
 
 @bot.message_handler(commands=['help'])
 def help_handler(message):
@@ -82,6 +167,8 @@ def help_handler(message):
         "• /menu - 打开图形化控制面板\n"
         "• /status - 快速查看系统状态\n"
         "• /stream - 直播推流控制\n"
+        "• /history [1h|6h|24h|7d] - 资源历史趋势\n"
+        "• /find <关键词> - 从本地索引搜索 Alist 文件\n"
         "• /cmd <命令> - 执行终端命令\n\n"
         "🔹 **功能说明**\n"
         "• **文件管理**: 浏览 Alist 文件，支持获取直链、推流直播、删除文件。\n"
@@ -92,237 +179,432 @@ def help_handler(message):
     )
     bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
 
-def escape_md(text):
-    return str(text).replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[').replace(']', '\\]')
+def answer(call, text=None, show_alert=False):
+    with answer_lock:
+        answered = getattr(call, 'answered', False)
+        call.answered = True
+    if answered:
+        # 已提前应答过 (排队提示)，弹窗类提示改为消息发送
+        if show_alert and text: bot.send_message(call.message.chat.id, text)
+        return
+    try: bot.answer_callback_query(call.id, text, show_alert=show_alert)
+    except Exception as e: print(f"Answer callback failed: {e}")
 
 @bot.callback_query_handler(func=lambda call: True)
 def callback(call):
-    global stream_process
     if not is_auth(call): return
-    cid = call.message.chat.id
-    mid = call.message.message_id
-    d = call.data
-
-    if d == "main_menu" or d == "refresh_main":
-        bot.edit_message_text(SystemUtils.get_status_msg(start_time), cid, mid, reply_markup=get_keyboard("main"), parse_mode='Markdown')
-
-    # --- File Manager ---
-    elif d == "fm_home":
-        path = FileManager.get_current_path(user_states, cid)
-        FileManager.list_dir(user_states, cid, path) # Refresh items
-        bot.edit_message_text(f"📂 **文件管理器**\n路径: `{path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, path, cid), parse_mode='Markdown')
-    
-    elif d == "fm_refresh":
-        path = FileManager.get_current_path(user_states, cid)
-        FileManager.list_dir(user_states, cid, path)
-        bot.edit_message_text(f"📂 **文件管理器**\n路径: `{path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, path, cid), parse_mode='Markdown')
-
-    elif d == "fm_next" or d == "fm_prev":
-        if cid in user_states:
-            if d == "fm_next": user_states[cid]['page'] += 1
-            else: user_states[cid]['page'] -= 1
-            path = FileManager.get_current_path(user_states, cid)
-            bot.edit_message_text(f"📂 **文件管理器**\n路径: `{path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, path, cid), parse_mode='Markdown')
-
-    elif d == "fm_up" or d == "fm_back":
+    queued = dispatcher.submit(call.message.chat.id, handle_callback, call)
+    if queued is None:
+        answer(call, "⚠️ 系统繁忙，请稍后再试")
+    elif queued:
+        answer(call, "⏳ 处理中...")
+
+def handle_callback(call):
+    try:
+        dispatch_callback(call)
+    finally:
+        # 处理器未应答时补一个空应答，结束客户端的加载动画
+        if not getattr(call, 'answered', False): answer(call)
+
+def dispatch_callback(call):
+    handler, args = router.resolve(call.data)
+    if handler is None:
+        return answer(call, "未知操作")
+    handler(call, call.message.chat.id, call.message.message_id, *args)
+
+def show_fm(cid, mid, path):
+    bot.edit_message_text(f"📂 **文件管理器**\n路径: `{path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, path, cid), parse_mode='Markdown')
+
+def item_path(cid, filename):
+    return os.path.join(FileManager.get_current_path(user_states, cid), filename).replace('\\', '/')
+
+@router.exact("noop")
+def on_noop(call, cid, mid):
+    pass
+
+@router.exact("main_menu", "refresh_main")
+def on_main_menu(call, cid, mid):
+    bot.edit_message_text(SystemUtils.get_status_msg(start_time), cid, mid, reply_markup=get_keyboard("main"), parse_mode='Markdown')
+
+# --- File Manager ---
+@router.exact("fm_home")
+def on_fm_home(call, cid, mid):
+    path = FileManager.get_current_path(user_states, cid)
+    FileManager.list_dir(user_states, cid, path) # Refresh items
+    show_fm(cid, mid, path)
+
+@router.exact("fm_refresh")
+def on_fm_refresh(call, cid, mid):
+    path = FileManager.get_current_path(user_states, cid)
+    FileManager.list_dir(user_states, cid, path, refresh=True)
+    show_fm(cid, mid, path)
+
+@router.exact("fm_next", "fm_prev")
+def on_fm_page(call, cid, mid):
+    if cid not in user_states: return
+    page = user_states[cid].get('page', 0) + (1 if call.data == "fm_next" else -1)
+    res = FileManager.load_page(user_states, cid, page)
+    if res is not True:
+        return answer(call, res or "请先刷新目录", show_alert=bool(res))
+    show_fm(cid, mid, FileManager.get_current_path(user_states, cid))
+
+@router.exact("fm_up", "fm_back")
+def on_fm_up(call, cid, mid):
+    curr = FileManager.get_current_path(user_states, cid)
+    if call.data == "fm_up":
+        if curr != '/':
+            curr = os.path.dirname(curr).replace('\\', '/')
+            if curr == '': curr = '/'
+        FileManager.set_path(user_states, cid, curr)
+        FileManager.list_dir(user_states, cid, curr)
+    show_fm(cid, mid, curr)
+
+@router.prefix("fm_cd_", int)
+def on_fm_cd(call, cid, mid, idx):
+    folder = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not folder: return answer(call, "目录不存在")
+    new_path = item_path(cid, folder)
+    if FileManager.set_path(user_states, cid, new_path):
+        FileManager.list_dir(user_states, cid, new_path)
+        show_fm(cid, mid, new_path)
+    else:
+        answer(call, "无法进入目录")
+
+@router.prefix("fm_opt_", int)
+def on_fm_opt(call, cid, mid, idx):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    bot.edit_message_text(f"📄 **文件操作**: {escape_md(filename)}", cid, mid, reply_markup=get_keyboard("fm_file_opt", user_states, idx, cid), parse_mode='Markdown')
+
+@router.prefix("fm_del_conf_", int)
+def on_fm_del_conf(call, cid, mid, idx):
+    bot.edit_message_text("⚠️ **确认删除?**", cid, mid, reply_markup=get_keyboard("fm_del_conf", user_states, idx, cid), parse_mode='Markdown')
+
+@router.prefix("fm_del_exec_", int)
+def on_fm_del_exec(call, cid, mid, idx):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    if FileManager.delete_file(item_path(cid, filename)):
+        answer(call, "✅ 文件已删除", show_alert=True)
+        # Refresh list
         curr = FileManager.get_current_path(user_states, cid)
-        if d == "fm_up":
-            if curr != '/':
-                curr = os.path.dirname(curr).replace('\\', '/')
-                if curr == '': curr = '/'
-            FileManager.set_path(user_states, cid, curr)
-            FileManager.list_dir(user_states, cid, curr)
-        bot.edit_message_text(f"📂 **文件管理器**\n路径: `{curr}`", cid, mid, reply_markup=get_keyboard("fm", user_states, curr, cid), parse_mode='Markdown')
-
-    elif d.startswith("fm_cd_"):
-        idx = d[6:]
-        folder = FileManager.get_item_by_idx(user_states, cid, idx)
-        if folder:
-            curr = FileManager.get_current_path(user_states, cid)
-            new_path = os.path.join(curr, folder).replace('\\', '/')
-            if FileManager.set_path(user_states, cid, new_path):
-                FileManager.list_dir(user_states, cid, new_path)
-                bot.edit_message_text(f"📂 **文件管理器**\n路径: `{new_path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, new_path, cid), parse_mode='Markdown')
-            else:
-                bot.answer_callback_query(call.id, "无法进入目录")
-        else:
-            bot.answer_callback_query(call.id, "目录不存在")
-
-    elif d.startswith("fm_opt_"):
-        idx = d[7:]
-        filename = FileManager.get_item_by_idx(user_states, cid, idx)
-        if filename:
-            bot.edit_message_text(f"📄 **文件操作**: {escape_md(filename)}", cid, mid, reply_markup=get_keyboard("fm_file_opt", user_states, idx, cid), parse_mode='Markdown')
-        else:
-            bot.answer_callback_query(call.id, "文件不存在")
-
-    elif d.startswith("fm_del_conf_"):
-        idx = d[12:]
-        bot.edit_message_text("⚠️ **确认删除?**", cid, mid, reply_markup=get_keyboard("fm_del_conf", user_states, idx, cid), parse_mode='Markdown')
-
-    elif d.startswith("fm_del_exec_"):
-        idx = d[12:]
-        filename = FileManager.get_item_by_idx(user_states, cid, idx)
-        if filename:
-            path = os.path.join(FileManager.get_current_path(user_states, cid), filename).replace('\\', '/')
-            if FileManager.delete_file(path):
-                bot.answer_callback_query(call.id, "✅ 文件已删除", show_alert=True)
-                # Refresh list
-                curr = FileManager.get_current_path(user_states, cid)
-                FileManager.list_dir(user_states, cid, curr)
-                bot.edit_message_text(f"📂 **文件管理器**\n路径: `{curr}`", cid, mid, reply_markup=get_keyboard("fm", user_states, curr, cid), parse_mode='Markdown')
-            else:
-                bot.answer_callback_query(call.id, "❌ 删除失败", show_alert=True)
-        else:
-            bot.answer_callback_query(call.id, "文件不存在")
-
-    elif d.startswith("fm_stream_"):
-        idx = d[10:]
-        filename = FileManager.get_item_by_idx(user_states, cid, idx)
-        if not filename: return bot.answer_callback_query(call.id, "文件不存在")
-        bot.edit_message_text(f"为 {escape_md(filename)} 选择推流密钥:", cid, mid, reply_markup=get_keyboard("stream_select_key", user_states, idx, cid), parse_mode='Markdown')
-
-    elif d.startswith("fm_link_"):
-        idx = d[8:]
-        filename = FileManager.get_item_by_idx(user_states, cid, idx)
-        if not filename: return bot.answer_callback_query(call.id, "文件不存在")
-        path = os.path.join(FileManager.get_current_path(user_states, cid), filename).replace('\\', '/')
-        url = FileManager.get_file_url(path)
-        if url:
-            bot.send_message(cid, f"🔗 **{escape_md(filename)} 直链:**\n`{url}`", parse_mode='Markdown')
-            bot.answer_callback_query(call.id, "直链已发送")
-        else:
-            bot.answer_callback_query(call.id, "无法获取直链，请检查 Alist 配置", show_alert=True)
-
-    elif d == "fm_refresh":
-        path = FileManager.get_current_path(user_states, cid)
-        bot.edit_message_text(f"📂 **文件管理器**\n路径: `{path}`", cid, mid, reply_markup=get_keyboard("fm", user_states, path, cid), parse_mode='Markdown')
-
-    # --- Process Manager ---
-    elif d == "menu_proc":
-        procs = []
-        for p in psutil.process_iter(['pid', 'name', 'username', 'memory_percent']):
-            try:
-                if p.info['memory_percent'] > 0.5: # 只显示占用内存>0.5%的
-                    procs.append(p.info)
-            except: pass
-        
-        procs.sort(key=lambda x: x['memory_percent'], reverse=True)
-        msg = "⚙️ **Top 进程 (内存)**\n\n"
-        for p in procs[:10]:
-            msg += f"`{p['pid']}` | {p['name']} | {p['memory_percent']:.1f}%\n"
-        
-        bot.edit_message_text(msg, cid, mid, reply_markup=get_keyboard("proc"), parse_mode='Markdown')
-
-    # --- Network ---
-    elif d == "menu_net" or d == "refresh_net":
-        bot.edit_message_text("📡 **网络中心**", cid, mid, reply_markup=get_keyboard("net"))
-    
-    elif d == "scan_wifi":
-        bot.answer_callback_query(call.id, "正在扫描 WiFi...", show_alert=False)
-        try:
-            res = SystemUtils.run_cmd('termux-wifi-scaninfo')
-            info = json.loads(res)
-            msg = "🔍 **WiFi 扫描结果**\n"
-            for w in info[:10]:
-                msg += f"📶 {w.get('ssid', 'Hidden')} ({w.get('rssi', 0)}dBm)\n"
-            bot.send_message(cid, msg, parse_mode='Markdown')
-        except Exception as e:
-            bot.send_message(cid, f"❌ 扫描失败: {e}")
-
-    elif d == "check_ip":
-        ip = NetworkUtils.get_public_ip()
-        bot.answer_callback_query(call.id, f"IP: {ip}", show_alert=True)
-
-    elif d == "net_speed":
-        bot.answer_callback_query(call.id, "正在测速，请稍候...", show_alert=False)
-        bot.send_message(cid, "🚀 正在运行 Speedtest...")
-        threading.Thread(target=lambda: bot.send_message(cid, f"📊 **测速结果**\n```\n{SystemUtils.run_cmd('speedtest-cli --simple')}\n```", parse_mode='Markdown')).start()
-
-    # --- Alist ---
-    elif d == "menu_alist":
-        ver = AlistUtils.get_version()
-        lan_ip = NetworkUtils.get_lan_ip()
-        bot.edit_message_text(f"📂 **Alist 管理**\n版本: {ver}\n内网地址: http://{lan_ip}:5244", cid, mid, reply_markup=get_keyboard("alist"))
-
-    elif d == "alist_storage":
-        status = AlistUtils.get_storage_list()
-        bot.send_message(cid, status, parse_mode='Markdown')
-
-    elif d == "alist_reset_pwd":
-        bot.answer_callback_query(call.id, "正在重置密码...", show_alert=True)
-        try:
-            SystemUtils.run_cmd("pm2 stop alist")
-            time.sleep(2)
-            res = SystemUtils.run_cmd("alist admin set admin")
-            SystemUtils.run_cmd("pm2 restart alist")
-            bot.send_message(cid, f"✅ **密码重置结果**\n```\n{res}\n```\n默认密码: `admin`\n请稍候几秒再尝试登录。\n\n⚠️ **注意**: 密码重置后，原有的 Token 会失效。请在 Termux 控制台主菜单运行【6】重新获取 Token，否则文件管理功能将无法使用！", parse_mode='Markdown')
-        except Exception as e:
-            bot.send_message(cid, f"❌ 重置失败: {e}")
-            SystemUtils.run_cmd("pm2 restart alist")
-
-    elif d == "alist_logs":
-        log = SystemUtils.run_cmd("pm2 logs alist --lines 20 --nostream --no-color")
-        bot.send_message(cid, f"📝 **Alist Logs**\n```\n{log}\n```", parse_mode='Markdown')
-
-    # --- Stream ---
-    elif d == "menu_stream":
-        bot.edit_message_text("📺 **直播控制台**", cid, mid, reply_markup=get_keyboard("stream", stream_process=stream_process), parse_mode='Markdown')
-    
-    elif d == "stream_add_key":
-        msg = bot.send_message(cid, "➕ 请输入新密钥的名称 (例如: 频道1):")
-        bot.register_next_step_handler(msg, lambda m: process_add_key_name(m, cid))
-
-    elif d.startswith("stream_del_"):
-        name = d[11:]
-        if StreamManager.remove_key(name):
-            bot.answer_callback_query(call.id, f"已删除密钥: {name}")
-        else:
-            bot.answer_callback_query(call.id, "删除失败")
-        bot.edit_message_text("📺 **直播控制台**", cid, mid, reply_markup=get_keyboard("stream", stream_process=stream_process), parse_mode='Markdown')
-
-    elif d.startswith("stream_exec_"):
-        parts = d[12:].split('_', 1)
-        if len(parts) == 2:
-            idx, key_name = parts
-            filename = FileManager.get_item_by_idx(user_states, cid, idx)
-            if not filename: return bot.answer_callback_query(call.id, "文件不存在")
-            path = os.path.join(FileManager.get_current_path(user_states, cid), filename).replace('\\', '/')
-            url = FileManager.get_file_url(path)
-            if url:
-                stream_key = StreamManager.get_key(key_name)
-                if stream_key:
-                    bot.answer_callback_query(call.id, f"准备推流到 {key_name}...")
-                    start_ffmpeg_stream(url, cid, stream_key)
-                else:
-                    bot.answer_callback_query(call.id, "密钥不存在", show_alert=True)
-            else:
-                bot.answer_callback_query(call.id, "无法获取直链，请检查 Alist 配置", show_alert=True)
-
-    elif d.startswith("stream_use_"):
-        name = d[11:]
-        stream_key = StreamManager.get_key(name)
-        if stream_key:
-            msg = bot.send_message(cid, f"🔗 请回复要推流到 `{name}` 的直播源链接:", parse_mode='Markdown')
-            bot.register_next_step_handler(msg, lambda m: start_ffmpeg_stream(m.text.strip(), cid, stream_key))
-        else:
-            bot.answer_callback_query(call.id, "密钥不存在", show_alert=True)
-
-    elif d == "stream_input":
-        msg = bot.send_message(cid, "🔗 请回复临时直播源链接:")
-        bot.register_next_step_handler(msg, lambda m: start_ffmpeg_stream(m.text.strip(), cid, TG_RTMP_URL))
-    
-    elif d == "stop_stream":
-        if stream_process:
-            stop_stream_process(stream_process)
-            stream_process = None
-            bot.answer_callback_query(call.id, "已停止")
-        bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("stream", stream_process=stream_process))
-
-    elif d == "menu_logs":
-        bot_log = SystemUtils.run_cmd("pm2 logs bot --lines 15 --nostream --no-color")
-        alist_log = SystemUtils.run_cmd("pm2 logs alist --lines 15 --nostream --no-color")
-        bot.send_message(cid, f"📝 **Bot Logs**\n```\n{bot_log}\n```\n\n📝 **Alist Logs**\n```\n{alist_log}\n```", parse_mode='Markdown')
+        FileManager.list_dir(user_states, cid, curr)
+        show_fm(cid, mid, curr)
+    else:
+        answer(call, "❌ 删除失败", show_alert=True)
+
+@router.prefix("fm_stream_", int)
+def on_fm_stream(call, cid, mid, idx):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    bot.edit_message_text(f"为 {escape_md(filename)} 选择推流密钥:", cid, mid, reply_markup=get_keyboard("stream_select_key", user_states, idx, cid), parse_mode='Markdown')
+
+@router.prefix("fm_link_", int)
+def on_fm_link(call, cid, mid, idx):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    url = FileManager.get_file_url(item_path(cid, filename))
+    if url:
+        bot.send_message(cid, f"🔗 **{escape_md(filename)} 直链:**\n`{url}`", parse_mode='Markdown')
+        answer(call, "直链已发送")
+    else:
+        answer(call, "无法获取直链，请检查 Alist 配置", show_alert=True)
+
+# --- Batch operations (多选) ---
+@router.exact("fm_sel_mode")
+def on_fm_sel_mode(call, cid, mid):
+    enabled = FileManager.get_selection(user_states, cid) is None
+    FileManager.set_selection_mode(user_states, cid, enabled)
+    show_fm(cid, mid, FileManager.get_current_path(user_states, cid))
+
+@router.prefix("fm_sel_", int)
+def on_fm_sel(call, cid, mid, idx):
+    selection = FileManager.get_selection(user_states, cid)
+    name = FileManager.get_item_by_idx(user_states, cid, idx)
+    if selection is None or not name: return answer(call, "请先进入多选模式")
+    selection.symmetric_difference_update({name})
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("fm", user_states, FileManager.get_current_path(user_states, cid), cid))
+
+@router.exact("fm_sel_page", "fm_sel_clear")
+def on_fm_sel_bulk(call, cid, mid):
+    selection = FileManager.get_selection(user_states, cid)
+    if selection is None: return answer(call, "请先进入多选模式")
+    if call.data == "fm_sel_clear":
+        selection.clear()
+    else:
+        listing = user_states[cid]['items']
+        selection.update(name for _, name, _, _ in listing.page_items(user_states[cid].get('page', 0)))
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("fm", user_states, FileManager.get_current_path(user_states, cid), cid))
+
+@router.exact("fm_batch_del")
+def on_fm_batch_del(call, cid, mid):
+    if not FileManager.get_selection(user_states, cid): return answer(call, "请先选择文件")
+    bot.edit_message_text(f"⚠️ **确认删除已选的 {len(FileManager.get_selection(user_states, cid))} 项?**", cid, mid, reply_markup=get_keyboard("fm_batch_del_conf", user_states, None, cid), parse_mode='Markdown')
+
+@router.exact("fm_batch_del_exec")
+def on_fm_batch_del_exec(call, cid, mid):
+    selection = FileManager.get_selection(user_states, cid)
+    if not selection: return answer(call, "请先选择文件")
+    curr = FileManager.get_current_path(user_states, cid)
+    ok, err = FileManager.remove_files(curr, sorted(selection))
+    if not ok: return answer(call, err or "❌ 删除失败", show_alert=True)
+    answer(call, f"✅ 已删除 {len(selection)} 项", show_alert=True)
+    FileManager.set_selection_mode(user_states, cid, False)
+    FileManager.list_dir(user_states, cid, curr)
+    show_fm(cid, mid, curr)
+
+@router.exact("fm_batch_move", "fm_batch_copy")
+def on_fm_batch_transfer(call, cid, mid):
+    selection = FileManager.get_selection(user_states, cid)
+    if not selection: return answer(call, "请先选择文件")
+    action = "移动" if call.data == "fm_batch_move" else "复制"
+    msg = bot.send_message(cid, f"📦 请回复{action} {len(selection)} 项的目标目录 (例如: `/movies/2024`):", parse_mode='Markdown')
+    bot.register_next_step_handler(msg, lambda m: process_batch_transfer(m, cid, call.data == "fm_batch_move"))
+
+@router.exact("fm_batch_rename")
+def on_fm_batch_rename(call, cid, mid):
+    if not FileManager.get_selection(user_states, cid): return answer(call, "请先选择文件")
+    msg = bot.send_message(cid, "✏️ 请回复重命名规则 `旧文本=>新文本` (支持正则，例如: `\\.mkv$=>.mp4`):", parse_mode='Markdown')
+    bot.register_next_step_handler(msg, lambda m: process_batch_rename(m, cid))
+
+# --- Process Manager ---
+@router.exact("menu_proc")
+def on_menu_proc(call, cid, mid):
+    sort = user_states.get(cid, {}).get('proc_sort', 'cpu')
+    msg = ProcessSampler.format_rows(process_sampler.top(sort), sort)
+    bot.edit_message_text(msg, cid, mid, reply_markup=get_keyboard("proc", user_states, None, cid), parse_mode='Markdown')
+
+@router.prefix("proc_sort_", str)
+def on_proc_sort(call, cid, mid, sort):
+    if sort not in ProcessSampler.SORT_KEYS: return answer(call, "未知排序")
+    user_states.setdefault(cid, {'path': '/'})['proc_sort'] = sort
+    on_menu_proc(call, cid, mid)
+
+# --- Network ---
+@router.exact("menu_net", "refresh_net")
+def on_menu_net(call, cid, mid):
+    bot.edit_message_text("📡 **网络中心**", cid, mid, reply_markup=get_keyboard("net"))
+
+@router.exact("scan_wifi")
+def on_scan_wifi(call, cid, mid):
+    answer(call, "正在扫描 WiFi...", show_alert=False)
+    try:
+        res = SystemUtils.run_cmd('termux-wifi-scaninfo')
+        info = json.loads(res)
+        msg = "🔍 **WiFi 扫描结果**\n"
+        for w in info[:10]:
+            msg += f"📶 {w.get('ssid', 'Hidden')} ({w.get('rssi', 0)}dBm)\n"
+        bot.send_message(cid, msg, parse_mode='Markdown')
+    except Exception as e:
+        bot.send_message(cid, f"❌ 扫描失败: {e}")
+
+@router.exact("check_ip")
+def on_check_ip(call, cid, mid):
+    ip = NetworkUtils.get_public_ip()
+    answer(call, f"IP: {ip}", show_alert=True)
+
+@router.exact("net_speed")
+def on_net_speed(call, cid, mid):
+    answer(call, "正在测速，请稍候...", show_alert=False)
+    bot.send_message(cid, "🚀 正在运行 Speedtest...")
+    threading.Thread(target=lambda: bot.send_message(cid, f"📊 **测速结果**\n```\n{SystemUtils.run_cmd('speedtest-cli --simple')}\n```", parse_mode='Markdown')).start()
+
+# --- Alist ---
+@router.exact("menu_alist")
+def on_menu_alist(call, cid, mid):
+    ver = AlistUtils.get_version()
+    lan_ip = NetworkUtils.get_lan_ip()
+    bot.edit_message_text(f"📂 **Alist 管理**\n版本: {ver}\n内网地址: http://{lan_ip}:5244", cid, mid, reply_markup=get_keyboard("alist"))
+
+@router.exact("alist_storage")
+def on_alist_storage(call, cid, mid):
+    status = AlistUtils.get_storage_list()
+    bot.send_message(cid, status, parse_mode='Markdown')
+
+@router.exact("alist_reset_pwd")
+def on_alist_reset_pwd(call, cid, mid):
+    answer(call, "正在重置密码...", show_alert=True)
+    try:
+        SystemUtils.run_cmd("pm2 stop alist")
+        time.sleep(2)
+        res = SystemUtils.run_cmd("alist admin set admin")
+        SystemUtils.run_cmd("pm2 restart alist")
+        bot.send_message(cid, f"✅ **密码重置结果**\n```\n{res}\n```\n默认密码: `admin`\n请稍候几秒再尝试登录。\n\n⚠️ **注意**: 密码重置后，原有的 Token 会失效。请在 Termux 控制台主菜单运行【6】重新获取 Token，否则文件管理功能将无法使用！", parse_mode='Markdown')
+    except Exception as e:
+        bot.send_message(cid, f"❌ 重置失败: {e}")
+        SystemUtils.run_cmd("pm2 restart alist")
+
+@router.exact("alist_logs")
+def on_alist_logs(call, cid, mid):
+    log = "\n".join(pm2_tail("alist", 20)) or "无日志"
+    bot.send_message(cid, f"📝 <b>Alist Logs</b>\n{pre_text(log)}", reply_markup=get_keyboard("logs", data=["alist"]), parse_mode='HTML')
+
+# --- Stream ---
+@router.exact("menu_stream")
+def on_menu_stream(call, cid, mid):
+    bot.edit_message_text("📺 **直播控制台**", cid, mid, reply_markup=get_keyboard("stream"), parse_mode='Markdown')
+
+@router.exact("stream_add_key")
+def on_stream_add_key(call, cid, mid):
+    msg = bot.send_message(cid, "➕ 请输入新密钥的名称 (例如: 频道1):")
+    bot.register_next_step_handler(msg, lambda m: process_add_key_name(m, cid))
+
+@router.prefix("stream_del_", str)
+def on_stream_del(call, cid, mid, name):
+    if StreamManager.remove_key(name):
+        answer(call, f"已删除密钥: {name}")
+    else:
+        answer(call, "删除失败")
+    bot.edit_message_text("📺 **直播控制台**", cid, mid, reply_markup=get_keyboard("stream"), parse_mode='Markdown')
+
+@router.prefix("stream_exec_", int, str)
+def on_stream_exec(call, cid, mid, idx, key_name):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    path = item_path(cid, filename)
+    url = FileManager.get_file_url(path)
+    if not url: return answer(call, "无法获取直链，请检查 Alist 配置", show_alert=True)
+    stream_key = StreamManager.get_key(key_name)
+    if stream_key:
+        answer(call, f"准备推流到 {key_name}...")
+        start_ffmpeg_stream(url, cid, stream_key, path)
+    else:
+        answer(call, "密钥不存在", show_alert=True)
+
+@router.prefix("stream_use_", str)
+def on_stream_use(call, cid, mid, name):
+    stream_key = StreamManager.get_key(name)
+    if stream_key:
+        msg = bot.send_message(cid, f"🔗 请回复要推流到 `{name}` 的直播源链接:", parse_mode='Markdown')
+        bot.register_next_step_handler(msg, lambda m: start_ffmpeg_stream(m.text.strip(), cid, stream_key))
+    else:
+        answer(call, "密钥不存在", show_alert=True)
+
+def selected_keys(cid):
+    names = user_states.get(cid, {}).get('multi_keys', set())
+    return {name: key for name, key in StreamManager.load_keys().items() if name in names}
+
+@router.exact("stream_multi")
+def on_stream_multi(call, cid, mid):
+    bot.edit_message_text("🔀 **多路推流**\n选择多个密钥后，一个 ffmpeg 进程只编码一次并同时推送到全部目标。", cid, mid, reply_markup=get_keyboard("stream_multi", user_states, None, cid), parse_mode='Markdown')
+
+@router.prefix("stream_mtog_", str)
+def on_stream_mtog(call, cid, mid, name):
+    selected = user_states.setdefault(cid, {'path': '/'}).setdefault('multi_keys', set())
+    selected.symmetric_difference_update({name})
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("stream_multi", user_states, None, cid))
+
+@router.exact("stream_muse")
+def on_stream_muse(call, cid, mid):
+    keys = selected_keys(cid)
+    if len(keys) < 2: return answer(call, "请至少选择 2 个密钥", show_alert=True)
+    msg = bot.send_message(cid, f"🔗 请回复要同时推流到 {len(keys)} 个目标的直播源链接:")
+    bot.register_next_step_handler(msg, lambda m: start_ffmpeg_stream(m.text.strip(), cid, list(keys.values())))
+
+@router.prefix("stream_mexec_", int)
+def on_stream_mexec(call, cid, mid, idx):
+    filename = FileManager.get_item_by_idx(user_states, cid, idx)
+    if not filename: return answer(call, "文件不存在")
+    keys = selected_keys(cid)
+    if len(keys) < 2: return answer(call, "请至少选择 2 个密钥", show_alert=True)
+    path = item_path(cid, filename)
+    url = FileManager.get_file_url(path)
+    if not url: return answer(call, "无法获取直链，请检查 Alist 配置", show_alert=True)
+    answer(call, f"准备推流到 {', '.join(keys)}...")
+    start_ffmpeg_stream(url, cid, list(keys.values()), path)
+
+@router.exact("fm_playlist")
+def on_fm_playlist(call, cid, mid):
+    path = FileManager.get_current_path(user_states, cid)
+    bot.edit_message_text(f"📺 **连续推流**\n将按顺序播放 `{path}` 中的全部媒体文件，切换文件不中断直播。", cid, mid, reply_markup=get_keyboard("stream_select_playlist", user_states, path, cid), parse_mode='Markdown')
+
+@router.prefix("stream_plk_", str)
+def on_stream_pl(call, cid, mid, name):
+    stream_key = StreamManager.get_key(name)
+    if not stream_key: return answer(call, "密钥不存在", show_alert=True)
+    start_playlist(call, cid, stream_key)
+
+@router.exact("stream_plm")
+def on_stream_plm(call, cid, mid):
+    keys = selected_keys(cid)
+    if len(keys) < 2: return answer(call, "请至少选择 2 个密钥", show_alert=True)
+    start_playlist(call, cid, list(keys.values()))
+
+@router.exact("stream_pl_next", "stream_pl_shuffle")
+def on_playlist_control(call, cid, mid):
+    session = StreamManager.session
+    if not isinstance(session, PlaylistSession) or not StreamManager.is_running():
+        return answer(call, "当前没有连续推流")
+    if call.data == "stream_pl_next":
+        session.next()
+        answer(call, "⏭ 已切换到下一个")
+    else:
+        session.shuffle()
+        answer(call, "🔀 已打乱后续播放顺序")
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("stream"))
+
+def start_playlist(call, cid, outputs):
+    path = FileManager.get_current_path(user_states, cid)
+    selection = FileManager.get_selection(user_states, cid)
+    if selection:
+        # 多选模式下只播放所选的媒体文件
+        files = [(n, item_path(cid, n)) for n in sorted(selection) if os.path.splitext(n)[1].lower() in VIDEO_EXTS]
+    else:
+        files = FileManager.list_files(path, VIDEO_EXTS)
+    if isinstance(files, str): return answer(call, files, show_alert=True)
+    if not files: return answer(call, "该目录没有可推流的媒体文件", show_alert=True)
+    answer(call, f"共 {len(files)} 个文件，准备连续推流...")
+    bot.send_message(cid, f"🚀 启动连续推流: `{path}` ({len(files)} 个文件)", parse_mode='Markdown')
+    StreamManager.start_session(PlaylistSession(files, FileManager.get_file_url, outputs,
+                                                notify=lambda text: notify_admin(cid, text)))
+
+@router.exact("stream_input")
+def on_stream_input(call, cid, mid):
+    msg = bot.send_message(cid, "🔗 请回复临时直播源链接:")
+    bot.register_next_step_handler(msg, lambda m: start_ffmpeg_stream(m.text.strip(), cid, TG_RTMP_URL))
+
+@router.exact("stream_transcode")
+def on_stream_transcode(call, cid, mid):
+    StreamManager.force_transcode = not StreamManager.force_transcode
+    answer(call, "已开启强制转码" if StreamManager.force_transcode else "已恢复自动直通")
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("stream"))
+
+@router.exact("stop_stream")
+def on_stop_stream(call, cid, mid):
+    if StreamManager.stop_stream():
+        answer(call, "已停止")
+    bot.edit_message_reply_markup(cid, mid, reply_markup=get_keyboard("stream"))
+
+@router.exact("menu_logs")
+def on_menu_logs(call, cid, mid):
+    bot_log = "\n".join(pm2_tail("bot", 15)) or "无日志"
+    alist_log = "\n".join(pm2_tail("alist", 15)) or "无日志"
+    bot.send_message(cid, f"📝 <b>Bot Logs</b>\n{pre_text(bot_log, 1700)}\n\n📝 <b>Alist Logs</b>\n{pre_text(alist_log, 1700)}",
+                     reply_markup=get_keyboard("logs", data=["bot", "alist"]), parse_mode='HTML')
+
+@router.prefix("log_follow_", str)
+def on_log_follow(call, cid, mid, name):
+    if name not in ("bot", "alist"): return answer(call, "未知日志")
+    follower = LogFollower(name, on_update=lambda f: render_follow(f, cid, fmid, "👁 跟随中"), on_exit=lambda f: finish_follow(f, cid, fmid))
+    fmid = bot.send_message(cid, f"👁 正在跟随 <b>{name}</b> 日志，新内容将每 {follower.interval:.0f} 秒更新一次...",
+                            reply_markup=get_keyboard("log_follow", data=follower.id), parse_mode='HTML').message_id
+    follower.start()
+
+@router.prefix("log_unfollow_", int)
+def on_log_unfollow(call, cid, mid, follow_id):
+    follower = LogFollower.active.get(follow_id)
+    if not follower or not follower.stop(): return answer(call, "已停止跟随")
+    answer(call, "⏹ 已停止跟随")
+
+def render_follow(follower, cid, mid, status, markup=True):
+    text = f"{status} <b>{follower.name}</b> 日志 (新增 {follower.received} 行)\n{pre_text(chr(10).join(follower.lines) or '暂无新日志')}"
+    try:
+        bot.edit_message_text(text, cid, mid, reply_markup=get_keyboard("log_follow", data=follower.id) if markup else None, parse_mode='HTML')
+    except Exception as e:
+        if "message is not modified" not in str(e): raise
+
+def finish_follow(follower, cid, mid):
+    render_follow(follower, cid, mid, "⏰ 跟随超时已停止" if follower.timed_out else "⏹ 已停止跟随", markup=False)
 
 # --- Helpers ---
 def process_add_key_name(message, cid):
@@ -335,18 +617,57 @@ def process_add_key_value(message, cid, name):
     key = message.text.strip()
     if not key: return bot.send_message(cid, "密钥不能为空")
     StreamManager.add_key(name, key)
-    bot.send_message(cid, f"✅ 成功添加推流密钥: `{name}`", parse_mode='Markdown', reply_markup=get_keyboard("stream", stream_process=stream_process))
-
-def start_ffmpeg_stream(url, cid, rtmp_url):
-    global stream_process
-    if stream_process: stop_stream_process(stream_process)
-    bot.send_message(cid, "🚀 启动推流...")
-    cmd = ['ffmpeg', '-re', '-i', url, '-c:v', 'libx264', '-preset', 'ultrafast', '-f', 'flv', rtmp_url]
-    stream_process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=os.setsid)
-
-def stop_stream_process(proc):
-    try: os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-    except: pass
+    bot.send_message(cid, f"✅ 成功添加推流密钥: `{name}`", parse_mode='Markdown', reply_markup=get_keyboard("stream"))
+
+def finish_batch(cid, text):
+    FileManager.set_selection_mode(user_states, cid, False)
+    curr = FileManager.get_current_path(user_states, cid)
+    FileManager.list_dir(user_states, cid, curr)
+    bot.send_message(cid, f"{text}\n📂 **文件管理器**\n路径: `{curr}`", reply_markup=get_keyboard("fm", user_states, curr, cid), parse_mode='Markdown')
+
+def process_batch_transfer(message, cid, move):
+    selection = FileManager.get_selection(user_states, cid)
+    dst = (message.text or '').strip()
+    if not selection: return bot.send_message(cid, "已退出多选或未选择文件")
+    if not dst.startswith('/'): return bot.send_message(cid, "目标目录必须是以 / 开头的完整路径")
+    curr = FileManager.get_current_path(user_states, cid)
+    op = FileManager.move_files if move else FileManager.copy_files
+    ok, err = op(curr, dst, sorted(selection))
+    action = "移动" if move else "复制"
+    if not ok: return bot.send_message(cid, f"❌ {action}失败: {err}")
+    finish_batch(cid, f"✅ 已{action} {len(selection)} 项到 `{dst}`")
+
+def process_batch_rename(message, cid):
+    selection = FileManager.get_selection(user_states, cid)
+    rule = (message.text or '').strip()
+    if not selection: return bot.send_message(cid, "已退出多选或未选择文件")
+    if '=>' not in rule: return bot.send_message(cid, "格式错误，应为 `旧文本=>新文本`", parse_mode='Markdown')
+    pattern, repl = rule.split('=>', 1)
+    try:
+        renames = [(n, re.sub(pattern, repl, n)) for n in sorted(selection)]
+    except re.error as e:
+        return bot.send_message(cid, f"❌ 正则错误: {e}")
+    renames = [(src, new) for src, new in renames if new and new != src]
+    if not renames: return bot.send_message(cid, "没有文件名发生变化")
+    ok, err = FileManager.rename_files(FileManager.get_current_path(user_states, cid), renames)
+    if not ok: return bot.send_message(cid, f"❌ 重命名失败: {err}")
+    finish_batch(cid, f"✅ 已重命名 {len(renames)} 项")
+
+def start_ffmpeg_stream(url, cid, outputs, path=None):
+    StreamManager.stop_stream()
+    info = None if StreamManager.force_transcode else FFmpegUtils.probe(url)
+    plan = FFmpegUtils.plan(info, StreamManager.force_transcode)
+    targets = f"，{len(outputs)} 路输出" if isinstance(outputs, list) and len(outputs) > 1 else ""
+    bot.send_message(cid, f"🚀 启动推流... ({FFmpegUtils.describe(plan)}{targets})")
+    # Alist 文件推流在重连前重新获取直链，避免签名过期
+    resolver = (lambda: FileManager.get_file_url(path, refresh=True)) if path else None
+    StreamManager.start_stream(url, lambda u, profile: FFmpegUtils.build_cmd(u, outputs, plan, profile),
+                               resolver=resolver, notify=lambda text: notify_admin(cid, text),
+                               governable=plan['video'] == 'transcode')
+
+def notify_admin(cid, text):
+    try: bot.send_message(ADMIN_ID if ADMIN_ID != 0 else cid, text)
+    except Exception as e: print(f"Notify failed: {e}")
 
 # --- Monitor ---
 # Monitor is now handled by modules.monitor.Monitor class
@@ -360,15 +681,24 @@ except:
 
 telebot.logger.setLevel(logging.INFO)
 
+# 配置了 WEBHOOK_URL 时优先使用 webhook，不可用时回退到长轮询；WEBHOOK_LOCAL=1 时只接收本地模拟更新
+if WEBHOOK_URL or WEBHOOK_LOCAL:
+    run_webhook(bot, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, allowed_updates=telebot.util.update_types,
+                local=WEBHOOK_LOCAL)
+
 print("Bot started. Polling...")
 try:
     bot.remove_webhook()
 except:
     pass
 
+# 轮询异常后指数退避重连 (1s 起，最长 15s)，网络短暂抖动时尽快恢复
+backoff = 1
 while True:
+    started = time.monotonic()
     try:
         bot.infinity_polling(timeout=20, long_polling_timeout=10, allowed_updates=telebot.util.update_types, skip_pending=True)
     except Exception as e:
         print(f"Polling error: {e}")
-        time.sleep(15)
+    backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 15)
+    time.sleep(backoff)
@@ -1,6 +1,265 @@
 import requests
 import os
-from modules.config import ALIST_URL, get_alist_token
+import calendar
+import threading
+import time
+from array import array
+from urllib.parse import urlparse, parse_qsl
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from modules.config import ALIST_URL, get_alist_token, env_store
+
+class AlistClient:
+    # 每个接口的超时 (秒)，未列出的使用 DEFAULT_TIMEOUT
+    TIMEOUTS = {
+        '/api/public/settings': 2,
+        '/api/fs/list': 10,
+        '/api/fs/get': 5,
+        '/api/fs/remove': 5,
+        '/api/fs/move': 10,
+        '/api/fs/copy': 10,
+        '/api/fs/batch_rename': 10,
+        '/api/admin/storage/list': 5,
+    }
+    DEFAULT_TIMEOUT = 5
+    # 有副作用的接口: 读超时/响应中途断开时服务端可能已经执行，不能重发
+    UNSAFE = frozenset(('/api/fs/remove', '/api/fs/move', '/api/fs/copy', '/api/fs/batch_rename'))
+
+    def __init__(self, base_url, pool_size=4, retries=2, backoff=0.3):
+        self.base_url = base_url.rstrip('/')
+        # Keep-alive 连接池; 不对业务错误 (HTTP 状态码) 重试
+        # 幂等请求在连接失败和复用连接被重置时带退避重试；有副作用的请求 (含带 refresh 的列目录) 只在请求尚未发出时重试
+        self.session = self._session(pool_size, retries, retries, backoff)
+        self._once = self._session(pool_size, retries, 0, backoff)
+        self._lock = threading.Lock()
+        self._token = None
+        self._headers = {}
+        env_store.on_change('ALIST_TOKEN', self._on_token_change)
+
+    def _on_token_change(self, token):
+        # 控制台刷新 Token 后丢弃旧的请求头，避免继续使用失效 Token
+        with self._lock:
+            self._token = None
+            self._headers = {}
+
+    def auth_headers(self):
+        token = get_alist_token()
+        if not token: return None
+        with self._lock:
+            if token != self._token:
+                self._token = token
+                self._headers = {'Authorization': token}
+            return self._headers
+
+    @staticmethod
+    def _session(pool_size, retries, read, backoff):
+        retry = Retry(total=retries, connect=retries, read=read, status=0, other=0,
+                      backoff_factor=backoff, allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _timeout(self, endpoint):
+        return self.TIMEOUTS.get(endpoint, self.DEFAULT_TIMEOUT)
+
+    def post(self, endpoint, payload, headers=None, timeout=None):
+        session = self._once if endpoint in self.UNSAFE or payload.get('refresh') else self.session
+        return session.post(f"{self.base_url}{endpoint}", json=payload, headers=headers,
+                            timeout=timeout or self._timeout(endpoint))
+
+    def get(self, endpoint, headers=None, timeout=None):
+        return self.session.get(f"{self.base_url}{endpoint}", headers=headers,
+                                timeout=timeout or self._timeout(endpoint))
+
+alist_client = AlistClient(ALIST_URL)
+# 预读、直链预取、索引爬虫等后台请求使用独立的连接池，不占用交互请求的连接
+alist_background = AlistClient(ALIST_URL, pool_size=2)
+
+PAGE_SIZE = 10
+
+class DirPage:
+    # 单页条目的紧凑存储: 名称元组 + 目录标记 bytearray + 大小 array
+    __slots__ = ('names', 'dirs', 'sizes')
+
+    def __init__(self, items):
+        self.names = tuple(item['name'] for item in items)
+        self.dirs = bytearray(1 if item['is_dir'] else 0 for item in items)
+        self.sizes = array('q', (item.get('size') or 0 for item in items))
+
+    def __len__(self):
+        return len(self.names)
+
+class DirListing:
+    # 按需加载的目录视图，只保存已浏览过的页
+    def __init__(self, path, total=0, page_size=PAGE_SIZE):
+        self.path = path
+        self.total = total
+        self.page_size = page_size
+        self.pages = {}
+
+    def __len__(self):
+        return self.total
+
+    def page_count(self):
+        return max(1, -(-self.total // self.page_size))
+
+    def _locate(self, idx):
+        page, offset = divmod(idx, self.page_size)
+        block = self.pages.get(page)
+        if block is None or offset >= len(block): return None, 0
+        return block, offset
+
+    def name(self, idx):
+        block, offset = self._locate(idx)
+        return block.names[offset] if block else None
+
+    def page_items(self, page):
+        block = self.pages.get(page)
+        if not block: return []
+        start = page * self.page_size
+        return [(start + i, block.names[i], bool(block.dirs[i]), block.sizes[i]) for i in range(len(block))]
+
+def format_size(size_val):
+    if size_val > 1024 * 1024:
+        return f" ({size_val // (1024 * 1024)}MB)"
+    return f" ({size_val // 1024}KB)"
+
+class ListingCache:
+    # 目录分页缓存: (path, page) -> (total, DirPage)，TTL + LRU，按页数和条目总数双重限额
+    def __init__(self, ttl=120, max_pages=256, max_items=20000):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self.max_items = max_items
+        self._data = OrderedDict()  # (path, page) -> (expires_at, total, block)
+        self._item_count = 0
+        self._lock = threading.Lock()
+
+    def get(self, path, page):
+        key = (path, page)
+        with self._lock:
+            entry = self._data.get(key)
+            if not entry: return None
+            if entry[0] < time.monotonic():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, path, page, total, block):
+        key = (path, page)
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (time.monotonic() + self.ttl, total, block)
+            self._item_count += len(block)
+            while len(self._data) > self.max_pages or self._item_count > self.max_items:
+                self._pop(next(iter(self._data)))
+
+    def invalidate(self, path):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == path]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._item_count = 0
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry: self._item_count -= len(entry[2])
+
+class RawUrlCache:
+    # 直链缓存: path -> (expires_at, raw_url)，有效期取自直链的签名参数，留出余量后才视为过期
+    # 绝对时间戳 (Expires / e / deadline ...) 和相对秒数 (X-Amz-Expires + X-Amz-Date) 两类
+    ABS_KEYS = ('expires', 'x-oss-expires', 'e', 'deadline', 'x-expires', 'expire')
+    def __init__(self, default_ttl=300, max_ttl=3600, margin=60, max_entries=512):
+        self.default_ttl = default_ttl  # 无法识别签名有效期时 (如本地存储) 的缓存时长
+        self.max_ttl = max_ttl
+        self.margin = margin            # 提前失效，保证交给 ffmpeg 的直链还能用一段时间
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            entry = self._data.get(path)
+            if not entry: return None
+            if entry[0] < time.time():
+                del self._data[path]
+                return None
+            self._data.move_to_end(path)
+            return entry[1]
+
+    def put(self, path, url):
+        ttl = min(self.lifetime(url), self.max_ttl) - self.margin
+        if ttl <= 0: return
+        with self._lock:
+            self._data.pop(path, None)
+            self._data[path] = (time.time() + ttl, url)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate_dir(self, dir_path):
+        with self._lock:
+            for key in [k for k in self._data if normalize_path(os.path.dirname(k)) == dir_path]:
+                del self._data[key]
+
+    def lifetime(self, url):
+        # 直链剩余有效秒数，识别不到签名参数时返回 default_ttl
+        now = time.time()
+        try:
+            params = {k.lower(): v for k, v in parse_qsl(urlparse(url).query)}
+        except ValueError:
+            return self.default_ttl
+        if 'x-amz-expires' in params and 'x-amz-date' in params:
+            try:
+                signed = calendar.timegm(time.strptime(params['x-amz-date'], "%Y%m%dT%H%M%SZ"))
+                return signed + int(params['x-amz-expires']) - now
+            except ValueError:
+                pass
+        for key in self.ABS_KEYS:
+            value = params.get(key, '')
+            if value.isdigit():
+                ts = int(value)
+                if ts > 1e12: ts /= 1000  # 毫秒时间戳
+                return ts - now if ts > 1e9 else ts
+        return self.default_ttl
+
+listing_cache = ListingCache()
+raw_url_cache = RawUrlCache()
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='alist-prefetch')
+_url_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix='alist-rawurl')
+_url_gen = {}  # chat_id -> 可见页序号，翻页后旧页尚未执行的直链预取直接作废
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _single_flight(key, fn):
+    # 同一 key 的并发请求合并为一次调用，其余调用方等待同一个结果
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            _inflight[key] = fut
+    if not owner: return fut.result()
+    try:
+        res = fn()
+        fut.set_result(res)
+        return res
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+def normalize_path(path):
+    path = (path or '/').replace('\\', '/').rstrip('/')
+    return path or '/'
 
 class FileManager:
     @staticmethod
@@ -17,95 +276,231 @@ class FileManager:
         return True
 
     @staticmethod
-    def list_dir(user_states, chat_id, path):
-        token = get_alist_token()
-        if not token: return "⚠️ 未配置 ALIST_TOKEN。请在控制台运行 'npm start' 并选择选项 6 来自动配置 Token。"
+    def get_selection(user_states, chat_id):
+        # 多选模式下返回当前目录已选名称的集合，否则返回 None
+        sel = user_states.get(chat_id, {}).get('selection')
+        if not sel or sel['path'] != FileManager.get_current_path(user_states, chat_id): return None
+        return sel['names']
+
+    @staticmethod
+    def set_selection_mode(user_states, chat_id, enabled):
+        state = user_states.setdefault(chat_id, {'path': '/'})
+        state['selection'] = {'path': FileManager.get_current_path(user_states, chat_id), 'names': set()} if enabled else None
+
+    @staticmethod
+    def list_dir(user_states, chat_id, path, refresh=False):
+        key = normalize_path(path)
+        if refresh: listing_cache.invalidate(key)
+        res = FileManager._get_page(key, 0, refresh)
+        if isinstance(res, str): return res
+        total, block = res
+        listing = DirListing(key, total)
+        listing.pages[0] = block
+        if chat_id not in user_states:
+            user_states[chat_id] = {}
+        user_states[chat_id]['items'] = listing
+        user_states[chat_id]['page'] = 0
+        FileManager._read_ahead(listing, 1)
+        FileManager._prefetch_urls(chat_id, listing, 0)
+        return listing
+
+    @staticmethod
+    def load_page(user_states, chat_id, page):
+        listing = user_states.get(chat_id, {}).get('items')
+        if not listing: return False
+        page = max(0, min(page, listing.page_count() - 1))
+        if page not in listing.pages:
+            res = FileManager._get_page(listing.path, page)
+            if isinstance(res, str): return res
+            listing.total, listing.pages[page] = res
+        user_states[chat_id]['page'] = page
+        FileManager._read_ahead(listing, page + 1)
+        FileManager._prefetch_urls(chat_id, listing, page)
+        return True
+
+    @staticmethod
+    def _read_ahead(listing, page):
+        if page >= listing.page_count() or page in listing.pages: return
+        def task():
+            res = FileManager._get_page(listing.path, page, client=alist_background)
+            if not isinstance(res, str):
+                listing.pages.setdefault(page, res[1])
+        _prefetch_pool.submit(task)
+
+    @staticmethod
+    def _prefetch_urls(chat_id, listing, page):
+        # 后台解析当前可见页文件的直链，点击“获取直链”或推流时可直接命中缓存
+        gen = _url_gen[chat_id] = _url_gen.get(chat_id, 0) + 1
+        def task(path):
+            # 快速翻页时队列里积压的是已离开页面的请求，不再占用后台连接
+            if _url_gen.get(chat_id) != gen or raw_url_cache.get(path) is not None: return
+            FileManager.get_file_url(path, client=alist_background)
+        base = listing.path.rstrip('/')
+        for _, name, is_dir, _ in listing.page_items(page):
+            path = f"{base}/{name}"
+            # 已缓存或已有请求在途 (用户点击/上一次预取) 的路径不再重复请求
+            if is_dir or raw_url_cache.get(path) is not None or ('raw', path) in _inflight: continue
+            _url_pool.submit(task, path)
+
+    @staticmethod
+    def _get_page(path, page, refresh=False, client=alist_client):
+        if not refresh:
+            cached = listing_cache.get(path, page)
+            if cached is not None: return cached
+        # 预读和用户翻页可能同时请求同一页，合并为一次请求
         try:
-            headers = {'Authorization': token}
-            payload = {"path": path, "refresh": True}
-            resp = requests.post(f"{ALIST_URL}/api/fs/list", json=payload, headers=headers, timeout=10)
-            
-            try:
-                res = resp.json()
-            except:
-                return f"❌ API 解析错误: {resp.text[:100]}"
-
-            if res.get('code') == 200:
-                items = res['data']['content'] or []
-                res_items = []
-                for item in items:
-                    is_dir = item['is_dir']
-                    size = ""
-                    if not is_dir:
-                        size_val = item['size']
-                        if size_val > 1024 * 1024:
-                            size = f" ({size_val // (1024 * 1024)}MB)"
-                        else:
-                            size = f" ({size_val // 1024}KB)"
-                    res_items.append({'name': item['name'], 'is_dir': is_dir, 'size': size})
-                
-                if chat_id not in user_states:
-                    user_states[chat_id] = {}
-                user_states[chat_id]['items'] = res_items
-                user_states[chat_id]['page'] = 0
-                return res_items
-            
-            error_msg = f"❌ API 错误 ({res.get('code')}): {res.get('message')}"
-            if res.get('code') == 401:
-                error_msg += "\n\n💡 提示: 您的 Alist Token 已失效 (可能是因为重置了密码)。请在控制台主菜单选择【6】重新获取 Token。"
-            return error_msg
+            return _single_flight(('list', path, page), lambda: FileManager._fetch_page(path, page, refresh, client))
         except Exception as e:
             return f"❌ 请求异常: {str(e)}"
 
     @staticmethod
-    def delete_file(path):
-        token = get_alist_token()
-        if not token: return False
+    def _fetch_page(path, page, refresh=False, client=alist_client):
+        headers = client.auth_headers()
+        if not headers: return "⚠️ 未配置 ALIST_TOKEN。请在控制台运行 'npm start' 并选择选项 6 来自动配置 Token。"
+        # 只有显式刷新才让 Alist 回源查询网盘
+        payload = {"path": path, "refresh": refresh, "page": page + 1, "per_page": PAGE_SIZE}
+        resp = client.post("/api/fs/list", payload, headers=headers)
+
         try:
-            headers = {'Authorization': token}
-            # Alist remove API: /api/fs/remove
-            dir_path = os.path.dirname(path)
-            name = os.path.basename(path)
-            res = requests.post(f"{ALIST_URL}/api/fs/remove", json={"path": dir_path, "names": [name]}, headers=headers, timeout=5).json()
-            return res['code'] == 200
+            res = resp.json()
         except:
-            return False
+            return f"❌ API 解析错误: {resp.text[:100]}"
+
+        if res.get('code') == 200:
+            data = res['data'] or {}
+            block = DirPage(data.get('content') or [])
+            total = data.get('total') or 0
+            listing_cache.put(path, page, total, block)
+            return total, block
+
+        error_msg = f"❌ API 错误 ({res.get('code')}): {res.get('message')}"
+        if res.get('code') == 401:
+            error_msg += "\n\n💡 提示: 您的 Alist Token 已失效 (可能是因为重置了密码)。请在控制台主菜单选择【6】重新获取 Token。"
+        return error_msg
+
+    @staticmethod
+    def delete_file(path):
+        dir_path = os.path.dirname(path)
+        return FileManager.remove_files(dir_path, [os.path.basename(path)])[0]
+
+    # --- 批量操作: 每个目录一次 Alist 请求，完成后只失效相关目录的缓存 ---
+    @staticmethod
+    def remove_files(dir_path, names):
+        return FileManager._fs_op("/api/fs/remove", {"dir": dir_path, "names": list(names)}, dir_path)
+
+    @staticmethod
+    def move_files(src_dir, dst_dir, names):
+        return FileManager._fs_op("/api/fs/move", {"src_dir": src_dir, "dst_dir": dst_dir, "names": list(names)}, src_dir, dst_dir)
+
+    @staticmethod
+    def copy_files(src_dir, dst_dir, names):
+        return FileManager._fs_op("/api/fs/copy", {"src_dir": src_dir, "dst_dir": dst_dir, "names": list(names)}, dst_dir)
+
+    @staticmethod
+    def rename_files(src_dir, renames):
+        objs = [{"src_name": src, "new_name": new} for src, new in renames]
+        return FileManager._fs_op("/api/fs/batch_rename", {"src_dir": src_dir, "rename_objects": objs}, src_dir)
+
+    @staticmethod
+    def _fs_op(endpoint, payload, *dirs):
+        # 返回 (是否成功, 错误信息)
+        headers = alist_client.auth_headers()
+        if not headers: return False, "⚠️ 未配置 ALIST_TOKEN"
+        try:
+            res = alist_client.post(endpoint, payload, headers=headers).json()
+        except Exception as e:
+            return False, f"❌ 请求异常: {str(e)}"
+        if res.get('code') == 200:
+            for d in dirs:
+                listing_cache.invalidate(normalize_path(d))
+                raw_url_cache.invalidate_dir(normalize_path(d))
+            return True, ""
+        return False, f"❌ API 错误 ({res.get('code')}): {res.get('message')}"
 
     @staticmethod
     def get_item_by_idx(user_states, chat_id, idx):
         try:
-            return user_states[chat_id]['items'][int(idx)]['name']
+            return user_states[chat_id]['items'].name(int(idx))
         except:
             return None
 
     @staticmethod
-    def get_file_url(path):
-        token = get_alist_token()
-        if not token: return None
+    def list_entries(path, per_page=200, limit=5000, client=alist_client, throttle=None):
+        # 取目录下全部条目 (Alist 原始 dict)，失败返回错误字符串；throttle() 在每次分页请求前调用，用于后台限速
+        headers = client.auth_headers()
+        if not headers: return "⚠️ 未配置 ALIST_TOKEN。请在控制台运行 'npm start' 并选择选项 6 来自动配置 Token。"
+        base = normalize_path(path)
+        entries, page = [], 1
         try:
-            headers = {'Authorization': token}
-            res = requests.post(f"{ALIST_URL}/api/fs/get", json={"path": path}, headers=headers, timeout=5).json()
-            if res['code'] == 200:
-                return res['data']['raw_url']
-            return None
+            while len(entries) < limit:
+                payload = {"path": base, "refresh": False, "page": page, "per_page": per_page}
+                if throttle: throttle()
+                res = client.post("/api/fs/list", payload, headers=headers).json()
+                if res.get('code') != 200:
+                    return f"❌ API 错误 ({res.get('code')}): {res.get('message')}"
+                content = (res['data'] or {}).get('content') or []
+                entries.extend(content)
+                if len(content) < per_page or page * per_page >= ((res['data'] or {}).get('total') or 0): break
+                page += 1
+        except Exception as e:
+            return f"❌ 请求异常: {str(e)}"
+        return entries[:limit]
+
+    @staticmethod
+    def list_files(path, exts=None, per_page=200, limit=5000):
+        # 取目录下全部文件 (不含子目录)，用于生成播放队列；失败返回错误字符串
+        entries = FileManager.list_entries(path, per_page, limit)
+        if isinstance(entries, str): return entries
+        base = normalize_path(path).rstrip('/')
+        return [(item['name'], f"{base}/{item['name']}") for item in entries
+                if not item['is_dir'] and (not exts or os.path.splitext(item['name'])[1].lower() in exts)]
+
+    @staticmethod
+    def show_entries(user_states, chat_id, entries):
+        # 用给定条目 (如搜索结果) 生成一个完整的虚拟目录视图，条目名为相对根目录的路径
+        listing = DirListing('/', len(entries))
+        for page in range(0, len(entries), PAGE_SIZE):
+            listing.pages[page // PAGE_SIZE] = DirPage(entries[page:page + PAGE_SIZE])
+        state = user_states.setdefault(chat_id, {})
+        state.update(path='/', items=listing, page=0, selection=None)
+        return listing
+
+    @staticmethod
+    def get_file_url(path, refresh=False, client=alist_client):
+        # refresh=True 跳过缓存 (如推流因直链失效而重连时)
+        if not refresh:
+            url = raw_url_cache.get(path)
+            if url: return url
+        try:
+            return _single_flight(('raw', path), lambda: FileManager._fetch_file_url(path, client))
         except:
             return None
 
+    @staticmethod
+    def _fetch_file_url(path, client=alist_client):
+        headers = client.auth_headers()
+        if not headers: return None
+        res = client.post("/api/fs/get", {"path": path}, headers=headers).json()
+        if res['code'] == 200:
+            url = res['data']['raw_url']
+            if url: raw_url_cache.put(path, url)
+            return url
+        return None
+
 class AlistUtils:
     @staticmethod
     def get_version():
         try:
-            res = requests.get(f"{ALIST_URL}/api/public/settings", timeout=2).json()
+            res = alist_client.get("/api/public/settings").json()
             return res['data']['version']
         except: return "离线"
 
     @staticmethod
     def get_storage_list():
-        token = get_alist_token()
-        if not token: return "⚠️ 未配置 ALIST_TOKEN。请在控制台运行 'npm start' 并选择选项 6 来自动配置 Token。"
+        headers = alist_client.auth_headers()
+        if not headers: return "⚠️ 未配置 ALIST_TOKEN。请在控制台运行 'npm start' 并选择选项 6 来自动配置 Token。"
         try:
-            headers = {'Authorization': token}
-            res = requests.get(f"{ALIST_URL}/api/admin/storage/list", headers=headers, timeout=5).json()
+            res = alist_client.get("/api/admin/storage/list", headers=headers).json()
             if res['code'] == 200:
                 msg = "💾 **Alist 存储状态**\n"
                 for item in res['data']['content']:
@@ -1,24 +1,83 @@
 import os
+import time
+import json
+import hashlib
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from telebot import apihelper
 
 # --- 🔧 加载环境变量 ---
+class FileWatcher:
+    # 通过 (mtime, size) 判断文件是否被外部修改，stat 频率受 min_interval 限制
+    def __init__(self, path, min_interval=2.0):
+        self.path = path
+        self.min_interval = min_interval
+        self._stamp = None
+        self._next_check = 0
+
+    def changed(self, force=False):
+        now = time.monotonic()
+        if not force and now < self._next_check: return False
+        self._next_check = now + self.min_interval
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._stamp: return False
+        self._stamp = stamp
+        return True
+
+class EnvStore:
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self._watch = FileWatcher(path, check_interval)
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def reload(self, force=False):
+        with self._lock:
+            if not self._watch.changed(force): return
+            values = {}
+            try:
+                with open(self.path, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line and not line.startswith('#'):
+                            parts = line.split('=', 1)
+                            if len(parts) == 2:
+                                values[parts[0].strip()] = parts[1].strip()
+            except Exception as e:
+                print(f"Warning: Failed to load .env file: {e}")
+                return
+            before = {k: os.environ.get(k) for k in self._listeners}
+            os.environ.update(values)
+            changed = [k for k, v in before.items() if os.environ.get(k) != v]
+        for key in changed:
+            for callback in self._listeners[key]:
+                try: callback(os.environ.get(key, ''))
+                except Exception as e: print(f"Warning: env listener for {key} failed: {e}")
+
+    def get(self, key, default=''):
+        self.reload()
+        return os.environ.get(key, default)
+
+    def on_change(self, key, callback):
+        with self._lock:
+            self._listeners.setdefault(key, []).append(callback)
+
+def _find_env_path():
+    env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+    if not os.path.exists(env_path):
+        # Fallback to current dir if not found in parent
+        env_path = '.env'
+    return env_path
+
+env_store = EnvStore(_find_env_path())
+
 def load_env():
-    try:
-        env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-        if not os.path.exists(env_path):
-            # Fallback to current dir if not found in parent
-            env_path = '.env'
-            
-        with open(env_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    parts = line.split('=', 1)
-                    if len(parts) == 2:
-                        os.environ[parts[0].strip()] = parts[1].strip()
-    except Exception as e:
-        print(f"Warning: Failed to load .env file: {e}")
+    env_store.reload(force=True)
 
 load_env()
 
@@ -32,39 +91,111 @@ ADMIN_IDS = [ADMIN_ID]
 
 # --- ⚙️ 全局配置 ---
 TG_RTMP_URL = os.environ.get('RTMP_URL', '')
+# 1 = 始终转码 (忽略 ffprobe 检测结果)
+STREAM_FORCE_TRANSCODE = os.environ.get('STREAM_FORCE_TRANSCODE', '0') == '1'
 ALIST_URL = 'http://127.0.0.1:5244'
 
+# --- 🌐 Webhook (可选) ---
+# 设置 WEBHOOK_URL (反向代理/隧道对外的 https 地址) 后改用 webhook 接收更新，失败时回退到长轮询
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '127.0.0.1')
+# WEBHOOK_LOCAL=1: 只启动本地接收服务，不向 Telegram 注册 webhook，配合 python -m modules.webhook 离线测试
+WEBHOOK_LOCAL = os.environ.get('WEBHOOK_LOCAL', '0') == '1'
+try:
+    WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+except:
+    WEBHOOK_PORT = 8443
+# 未单独配置时由 BOT_TOKEN 派生，本地模拟发送工具也能算出同一个值
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()[:32]
+
 def get_alist_token():
-    load_env() # Reload env to get the latest token if updated
-    return os.environ.get('ALIST_TOKEN', '')
+    # 仅在 .env 的 mtime/size 变化时重新解析 (最多每 2 秒 stat 一次)
+    return env_store.get('ALIST_TOKEN', '')
+
+PROXY_PORTS = [7890, 10809, 2080, 25500, 8080, 1080, 8234]
+PROXY_CACHE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'proxy.json')
 
-def check_telegram_connection():
+def check_telegram_connection(proxy=None, timeout=3):
+    proxies = {'http': proxy, 'https': proxy} if proxy else None
     try:
-        requests.get("https://api.telegram.org", timeout=3)
+        requests.get("https://api.telegram.org", proxies=proxies, timeout=timeout)
         return True
     except:
         return False
 
-def auto_setup_proxy():
-    if check_telegram_connection():
-        return
-    
-    print("⚠️ 无法直连 Telegram API (可能是 Termux DNS 解析失败)，正在尝试自动检测本地 VPN 代理...")
-    common_ports = [7890, 10809, 2080, 25500, 8080, 1080, 8234]
-    for port in common_ports:
-        proxy_url = f"http://127.0.0.1:{port}"
-        try:
-            requests.get("https://api.telegram.org", proxies={"http": proxy_url, "https": proxy_url}, timeout=2)
-            apihelper.proxy = {'http': proxy_url, 'https': proxy_url}
-            print(f"✅ 成功自动匹配并配置本地代理: {proxy_url}")
-            return
-        except:
-            continue
-    print("❌ 自动检测代理失败。")
+def _load_cached_proxy():
+    try:
+        with open(PROXY_CACHE, 'r') as f:
+            return json.load(f).get('proxy')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _save_cached_proxy(proxy):
+    try:
+        os.makedirs(os.path.dirname(PROXY_CACHE), exist_ok=True)
+        tmp = PROXY_CACHE + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'proxy': proxy, 'checked': int(time.time())}, f)
+        os.replace(tmp, PROXY_CACHE)
+    except OSError as e:
+        print(f"Warning: Failed to save proxy cache: {e}")
+
+def _race(candidates, timeout):
+    # 并发探测直连和各代理端口，返回第一个成功的候选 (None 表示直连)，全部失败返回 False
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix='net-probe')
+    futures = {pool.submit(check_telegram_connection, proxy, timeout): proxy for proxy in candidates}
+    try:
+        for fut in as_completed(futures):
+            if fut.result():
+                return futures[fut]
+        return False
+    finally:
+        # 不等待其余仍在超时中的探测
+        pool.shutdown(wait=False, cancel_futures=True)
 
-auto_setup_proxy()
+def auto_setup_proxy(timeout=2):
+    # 启动阶段显式调用 (需在创建 TeleBot 之前): 先验证上次缓存的代理，失败再并发探测直连和本地代理端口
+    started = time.monotonic()
+    cached = _load_cached_proxy()
+    if cached and check_telegram_connection(cached, timeout):
+        winner = cached
+    else:
+        if cached:
+            print(f"⚠️ 缓存的代理 {cached} 已不可用，重新探测...")
+        winner = _race([None] + [f"http://127.0.0.1:{port}" for port in PROXY_PORTS], timeout)
+    elapsed = (time.monotonic() - started) * 1000
+    if winner is False:
+        print(f"❌ 无法连接 Telegram API，且未检测到可用的本地代理 ({elapsed:.0f}ms)。")
+        return None
+    if winner:
+        apihelper.proxy = {'http': winner, 'https': winner}
+        print(f"✅ 使用本地代理连接 Telegram: {winner} ({elapsed:.0f}ms)")
+    else:
+        print(f"✅ 直连 Telegram API 正常 ({elapsed:.0f}ms)")
+    if winner != cached:
+        _save_cached_proxy(winner)
+    return winner
 
 WIFI_CONFIG = {}
 PING_TARGET = '223.5.5.5' 
 ALERT_CPU = 90
 ALERT_MEM = 90
+ALERT_DISK = 90
+ALERT_BATTERY = 15
+
+# 状态采样间隔 (秒): CPU 变化快，电池/温度变化慢
+STATUS_INTERVALS = {
+    'cpu': 2,
+    'mem': 5,
+    'disk': 60,
+    'lan_ip': 60,
+    'temp': 30,
+    'battery': 60,
+}
+
+# 推流降档阈值: 温度/CPU 持续高于 HIGH 时降低画质，低于 LOW 一段时间后恢复
+GOVERNOR_TEMP_HIGH = 45
+GOVERNOR_TEMP_LOW = 40
+GOVERNOR_CPU_HIGH = 95
+GOVERNOR_CPU_LOW = 70
+GOVERNOR_BATTERY_LOW = 20
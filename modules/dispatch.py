@@ -0,0 +1,73 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class ChatDispatcher:
+    # 回调任务在有界线程池上执行: 同一聊天内严格按顺序，不同聊天之间并行
+    def __init__(self, workers=4, max_pending=200):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='callback')
+        self._queues = {}  # chat_id -> deque[(enqueued_at, fn, args)]
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._waits = deque(maxlen=500)  # 最近任务的排队等待时间 (秒)
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def submit(self, key, fn, *args):
+        # 返回 None 表示队列已满被拒绝，否则返回该任务是否需要排队等待
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending += 1
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((time.monotonic(), fn, args))
+                return True
+            self._queues[key] = deque([(time.monotonic(), fn, args)])
+            busy = len(self._queues) > self.workers
+        self._pool.submit(self._drain, key)
+        return busy
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                enqueued_at, fn, args = queue.popleft()
+            self._waits.append(time.monotonic() - enqueued_at)
+            try:
+                fn(*args)
+            except Exception as e:
+                self.failed += 1
+                print(f"Callback error: {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            depth = self._pending
+            chats = len(self._queues)
+        waits = sorted(self._waits)
+        if waits:
+            avg_ms = sum(waits) / len(waits) * 1000
+            p95_ms = waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000
+            max_ms = waits[-1] * 1000
+        else:
+            avg_ms = p95_ms = max_ms = 0.0
+        return {'depth': depth, 'active_chats': chats, 'avg_wait_ms': avg_ms, 'p95_wait_ms': p95_ms,
+                'max_wait_ms': max_ms, 'completed': self.completed, 'rejected': self.rejected, 'failed': self.failed}
+
+    def stats_msg(self):
+        s = self.stats()
+        return (f"🧵 回调队列: `{s['depth']}` 待处理 / `{s['active_chats']}` 个会话\n"
+                f"⏳ 排队等待: 平均 `{s['avg_wait_ms']:.0f}ms` | P95 `{s['p95_wait_ms']:.0f}ms` | 最大 `{s['max_wait_ms']:.0f}ms`\n"
+                f"✅ 已完成 `{s['completed']}` | ❌ 失败 `{s['failed']}` | 🚫 拒绝 `{s['rejected']}`")
@@ -0,0 +1,105 @@
+import math
+import time
+import threading
+from array import array
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+class RingBuffer:
+    # 定长 float 环形缓冲区，内存固定为 size * 4 字节，空位为 NaN
+    __slots__ = ('values', 'size', 'pos', 'count')
+
+    def __init__(self, size):
+        self.values = array('f', [math.nan]) * size
+        self.size = size
+        self.pos = 0
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.pos] = math.nan if value is None else value
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def latest(self, n):
+        # 最近 n 个值，按时间从旧到新
+        n = min(n, self.count)
+        start = (self.pos - n) % self.size
+        if start + n <= self.size:
+            return self.values[start:start + n].tolist()
+        return (self.values[start:] + self.values[:self.pos]).tolist()
+
+class Tier:
+    # 一个分辨率档: 每 step 秒一个点，来自更细粒度样本的平均值
+    __slots__ = ('step', 'buf', 'acc', 'acc_n', 'slot')
+
+    def __init__(self, step, size):
+        self.step = step
+        self.buf = RingBuffer(size)
+        self.acc = 0.0
+        self.acc_n = 0
+        self.slot = None
+
+    def add(self, ts, value):
+        slot = int(ts // self.step)
+        if self.slot is None:
+            self.slot = slot
+        if slot != self.slot:
+            self.buf.append(self.acc / self.acc_n if self.acc_n else None)
+            # 中间缺失的时间段补 NaN，保持等间隔
+            for _ in range(min(slot - self.slot - 1, self.buf.size)):
+                self.buf.append(None)
+            self.slot, self.acc, self.acc_n = slot, 0.0, 0
+        if value is not None and not math.isnan(value):
+            self.acc += value
+            self.acc_n += 1
+
+class MetricHistory:
+    # 24 小时 10 秒精度 + 7 天 5 分钟精度，每个指标约 43KB
+    TIERS = ((10, 8640), (300, 2016))
+    METRICS = (('cpu', "💻 CPU", "%"), ('mem', "🧠 内存", "%"), ('temp_c', "🌡 温度", "°C"),
+               ('battery_pct', "🔋 电量", "%"), ('speed', "📺 推流速度", "x"))
+
+    def __init__(self):
+        self._tiers = {name: [Tier(step, size) for step, size in self.TIERS] for name, _, _ in self.METRICS}
+        self._lock = threading.Lock()
+
+    def record(self, values, ts=None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for name, tiers in self._tiers.items():
+                value = values.get(name)
+                for tier in tiers:
+                    tier.add(ts, float(value) if value is not None else None)
+
+    def series(self, name, seconds):
+        with self._lock:
+            tier = next((t for t in self._tiers[name] if seconds <= t.step * t.buf.size), self._tiers[name][-1])
+            return tier.buf.latest(max(1, int(seconds // tier.step)))
+
+    @staticmethod
+    def sparkline(values, width=30):
+        if not values: return ""
+        # 先按宽度分桶取平均，再映射到 8 级字符
+        buckets = []
+        per = len(values) / width if len(values) > width else 1
+        for i in range(min(width, len(values))):
+            chunk = [v for v in values[int(i * per):int((i + 1) * per) or int(i * per) + 1] if not math.isnan(v)]
+            buckets.append(sum(chunk) / len(chunk) if chunk else None)
+        real = [b for b in buckets if b is not None]
+        if not real: return ""
+        lo, hi = min(real), max(real)
+        span = (hi - lo) or 1
+        return "".join(" " if b is None else SPARK_CHARS[min(7, int((b - lo) / span * 8))] for b in buckets)
+
+    def render(self, seconds, label):
+        lines = [f"📈 **历史趋势 ({label})**", "```"]
+        for name, title, unit in self.METRICS:
+            values = self.series(name, seconds)
+            real = [v for v in values if not math.isnan(v)]
+            if not real:
+                lines.append(f"{title}: 无数据")
+                continue
+            lines.append(f"{title} {real[-1]:.1f}{unit} (最低 {min(real):.1f} / 平均 {sum(real) / len(real):.1f} / 最高 {max(real):.1f})")
+            lines.append(self.sparkline(values))
+        lines.append("```")
+        return "\n".join(lines)
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import time
+import threading
+import itertools
+from collections import deque
+
+PM2_HOME = os.environ.get('PM2_HOME') or os.path.join(os.path.expanduser('~'), '.pm2')
+ANSI_RE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+
+def pm2_log_paths(name):
+    # 返回 [(标签, 路径)]: 优先读取 pm2 save 生成的 dump.pm2，其次使用 pm2 默认命名规则
+    try:
+        with open(os.path.join(PM2_HOME, 'dump.pm2'), encoding='utf-8') as f:
+            for app in json.load(f):
+                if app.get('name') == name:
+                    return [(label, app[key]) for label, key in (('out', 'pm_out_log_path'), ('err', 'pm_err_log_path'))
+                            if app.get(key) and app[key] != '/dev/null']
+    except (OSError, ValueError, TypeError):
+        pass
+    safe = re.sub(r'[^a-zA-Z0-9\-_]', '-', name)
+    return [('out', os.path.join(PM2_HOME, 'logs', f"{safe}-out.log")),
+            ('err', os.path.join(PM2_HOME, 'logs', f"{safe}-error.log"))]
+
+def tail_lines(path, n, block_size=8192):
+    # 从文件末尾按块向前读取，直到凑够 n 行，不读取整个文件
+    try:
+        with open(path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            data = b''
+            while pos > 0 and data.count(b'\n') <= n:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    return [ANSI_RE.sub('', line) for line in data.decode('utf-8', 'replace').splitlines()[-n:]]
+
+def pm2_tail(name, n):
+    # 合并同一进程的 stdout/stderr 尾部，stderr 行加前缀区分
+    lines = []
+    for label, path in pm2_log_paths(name):
+        prefix = "[err] " if label == 'err' else ""
+        lines.extend(prefix + line for line in tail_lines(path, n))
+    return lines
+
+class LogFollower:
+    # 跟随日志文件的新增内容: 轮询文件大小，批量累积新行后按最小间隔回调，超时自动停止
+    active = {}  # follow_id -> LogFollower
+    _ids = itertools.count(1)
+
+    MAX_READ = 64 * 1024  # 单次轮询最多读取的字节数，积压过多时跳到末尾
+
+    def __init__(self, name, on_update, on_exit, interval=3.0, poll=1.0, keep=40, timeout=600):
+        self.id = next(self._ids)
+        self.name = name
+        self.on_update = on_update  # on_update(follower) 有新行时调用，两次间隔至少 interval 秒
+        self.on_exit = on_exit      # on_exit(follower) 停止或超时后调用一次
+        self.interval = interval
+        self.poll = poll
+        self.timeout = timeout
+        self.lines = deque(maxlen=keep)
+        self.received = 0
+        self.timed_out = False
+        self.stop_event = threading.Event()
+        self._files = {}  # path -> [标签, inode, offset, 未完成的行]
+
+    def start(self):
+        for label, path in pm2_log_paths(self.name):
+            try:
+                st = os.stat(path)
+                self._files[path] = [label, st.st_ino, st.st_size, b'']
+            except OSError:
+                self._files[path] = [label, None, 0, b'']
+        LogFollower.active[self.id] = self
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.stop_event.is_set(): return False
+        self.stop_event.set()
+        return True
+
+    def _read_new(self, path, state):
+        label, inode, offset, partial = state
+        try:
+            st = os.stat(path)
+        except OSError:
+            return []
+        # 日志被轮转 (inode 变化) 或截断时从头开始读
+        if st.st_ino != inode or st.st_size < offset:
+            inode, offset, partial = st.st_ino, 0, b''
+        if st.st_size == offset:
+            # 轮转后的新文件还是空的: 同样记下重置后的偏移，否则下次会从旧文件的偏移处继续读
+            state[1:] = [inode, offset, partial]
+            return []
+        if st.st_size - offset > self.MAX_READ:
+            offset, partial = st.st_size - self.MAX_READ, b''
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = partial + f.read(st.st_size - offset)
+        *complete, partial = data.split(b'\n')
+        state[1:] = [inode, st.st_size, partial]
+        prefix = "[err] " if label == 'err' else ""
+        return [prefix + ANSI_RE.sub('', line.decode('utf-8', 'replace')) for line in complete]
+
+    def _run(self):
+        started = time.monotonic()
+        last, dirty = 0.0, False
+        try:
+            while not self.stop_event.wait(self.poll):
+                if time.monotonic() - started > self.timeout:
+                    self.timed_out = True
+                    break
+                for path, state in self._files.items():
+                    new = self._read_new(path, state)
+                    if new:
+                        self.lines.extend(new)
+                        self.received += len(new)
+                        dirty = True
+                if dirty and time.monotonic() - last >= self.interval:
+                    dirty, last = False, time.monotonic()
+                    try:
+                        self.on_update(self)
+                    except Exception as e:
+                        print(f"Log follow update error: {e}")
+        finally:
+            self.stop_event.set()
+            LogFollower.active.pop(self.id, None)
+            try:
+                self.on_exit(self)
+            except Exception as e:
+                print(f"Log follow exit error: {e}")
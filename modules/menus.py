@@ -1,11 +1,11 @@
 from telebot import types
-from modules.alist import FileManager, AlistUtils
+from modules.alist import FileManager, AlistUtils, format_size
 from modules.utils import NetworkUtils
 from modules.config import ALIST_URL
 
-from modules.stream import StreamManager
+from modules.stream import StreamManager, PlaylistSession, STREAM_PROFILES
 
-def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_process=None):
+def get_keyboard(menu_type, user_states=None, data=None, chat_id=None):
     markup = types.InlineKeyboardMarkup()
     
     if menu_type == "main":
@@ -31,31 +31,56 @@ def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_pr
         markup.row(types.InlineKeyboardButton("⬆️ 上一级", callback_data="fm_up"))
         
         # Pagination logic
-        items = user_states.get(chat_id, {}).get('items', [])
+        listing = user_states.get(chat_id, {}).get('items')
         page = user_states.get(chat_id, {}).get('page', 0)
-        page_size = 10
-        start = page * page_size
-        end = start + page_size
         
-        if items:
-            for idx, item in enumerate(items[start:end]):
-                real_idx = start + idx
-                if item['is_dir']:
-                    markup.add(types.InlineKeyboardButton(f"📁 {item['name']}", callback_data=f"fm_cd_{real_idx}"))
+        selection = FileManager.get_selection(user_states, chat_id)
+        
+        if listing:
+            for real_idx, name, is_dir, size in listing.page_items(page):
+                if selection is not None:
+                    mark = "✅" if name in selection else "⬜"
+                    icon = "📁" if is_dir else "📄"
+                    markup.add(types.InlineKeyboardButton(f"{mark} {icon} {name}", callback_data=f"fm_sel_{real_idx}"))
+                elif is_dir:
+                    markup.add(types.InlineKeyboardButton(f"📁 {name}", callback_data=f"fm_cd_{real_idx}"))
                 else:
-                    markup.add(types.InlineKeyboardButton(f"📄 {item['name']}{item['size']}", callback_data=f"fm_opt_{real_idx}"))
+                    markup.add(types.InlineKeyboardButton(f"📄 {name}{format_size(size)}", callback_data=f"fm_opt_{real_idx}"))
             
             # Pagination buttons
             nav_btns = []
             if page > 0:
                 nav_btns.append(types.InlineKeyboardButton("⬅️ 上一页", callback_data="fm_prev"))
-            if end < len(items):
+            if listing.page_count() > 1:
+                nav_btns.append(types.InlineKeyboardButton(f"{page + 1}/{listing.page_count()}", callback_data="noop"))
+            if page + 1 < listing.page_count():
                 nav_btns.append(types.InlineKeyboardButton("下一页 ➡️", callback_data="fm_next"))
             if nav_btns:
                 markup.row(*nav_btns)
         else:
             markup.add(types.InlineKeyboardButton("📭 目录为空", callback_data="noop"))
             
+        if selection is not None:
+            count = len(selection)
+            markup.row(
+                types.InlineKeyboardButton("☑️ 全选本页", callback_data="fm_sel_page"),
+                types.InlineKeyboardButton(f"❎ 清空 ({count})", callback_data="fm_sel_clear")
+            )
+            markup.row(
+                types.InlineKeyboardButton("🗑 删除", callback_data="fm_batch_del"),
+                types.InlineKeyboardButton("📦 移动", callback_data="fm_batch_move"),
+                types.InlineKeyboardButton("📋 复制", callback_data="fm_batch_copy"),
+                types.InlineKeyboardButton("✏️ 重命名", callback_data="fm_batch_rename")
+            )
+            markup.row(
+                types.InlineKeyboardButton("📺 连续推流所选", callback_data="fm_playlist"),
+                types.InlineKeyboardButton("✖️ 退出多选", callback_data="fm_sel_mode")
+            )
+        else:
+            markup.row(
+                types.InlineKeyboardButton("☑️ 多选", callback_data="fm_sel_mode"),
+                types.InlineKeyboardButton("📺 连续推流本目录", callback_data="fm_playlist")
+            )
         markup.row(
             types.InlineKeyboardButton("🔄 刷新", callback_data="fm_refresh"),
             types.InlineKeyboardButton("🔙 主菜单", callback_data="main_menu")
@@ -83,7 +108,28 @@ def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_pr
             types.InlineKeyboardButton("❌ 取消", callback_data=f"fm_opt_{idx}")
         )
 
+    elif menu_type == "fm_batch_del_conf":
+        count = len(FileManager.get_selection(user_states, chat_id) or ())
+        markup.row(
+            types.InlineKeyboardButton(f"✅ 确认删除 {count} 项", callback_data="fm_batch_del_exec"),
+            types.InlineKeyboardButton("❌ 取消", callback_data="fm_back")
+        )
+
+    elif menu_type == "logs":
+        markup.row(*[types.InlineKeyboardButton(f"👁 跟随 {name}", callback_data=f"log_follow_{name}") for name in data])
+
+    elif menu_type == "log_follow":
+        markup.row(types.InlineKeyboardButton("⏹ 停止跟随", callback_data=f"log_unfollow_{data}"))
+
+    elif menu_type == "cmd_run":
+        markup.row(types.InlineKeyboardButton("⏹ 终止", callback_data=f"cmd_cancel_{data}"))
+
     elif menu_type == "proc":
+        sort = (user_states or {}).get(chat_id, {}).get('proc_sort', 'cpu')
+        markup.row(*[
+            types.InlineKeyboardButton(("✅ " if sort == key else "") + title, callback_data=f"proc_sort_{key}")
+            for key, title in (("cpu", "CPU"), ("mem", "内存"), ("io", "IO"))
+        ])
         markup.row(types.InlineKeyboardButton("🔄 刷新列表", callback_data="menu_proc"))
         markup.row(types.InlineKeyboardButton("🔙 主菜单", callback_data="main_menu"))
 
@@ -113,8 +159,26 @@ def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_pr
         )
 
     elif menu_type == "stream":
-        status = "🟢 推流中" if stream_process and stream_process.poll() is None else "🔴 空闲"
+        session = StreamManager.session
+        running = StreamManager.is_running()
+        if running and session.state == 'restarting':
+            status = f"🟡 重连中 (第 {len(session.restarts)} 次)"
+        elif running:
+            status = "🟢 推流中"
+        else:
+            status = "🔴 空闲"
         markup.row(types.InlineKeyboardButton(f"状态: {status}", callback_data="noop"))
+        if running:
+            markup.row(types.InlineKeyboardButton(f"📈 {session.stats.summary()}", callback_data="menu_stream"))
+            if session.governable:
+                markup.row(types.InlineKeyboardButton(f"⚙️ 画质档位: {STREAM_PROFILES[session.profile]['name']}", callback_data="noop"))
+        if running and isinstance(session, PlaylistSession):
+            idx, name = session.current()
+            markup.row(types.InlineKeyboardButton(f"🎵 {idx + 1}/{len(session.items)} {name}", callback_data="noop"))
+            markup.row(
+                types.InlineKeyboardButton("⏭ 下一个", callback_data="stream_pl_next"),
+                types.InlineKeyboardButton("🔀 随机打乱", callback_data="stream_pl_shuffle")
+            )
         
         keys = StreamManager.load_keys()
         if keys:
@@ -131,6 +195,9 @@ def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_pr
             types.InlineKeyboardButton("➕ 添加新密钥", callback_data="stream_add_key"),
             types.InlineKeyboardButton("▶️ 临时推流", callback_data="stream_input")
         )
+        markup.row(types.InlineKeyboardButton("🔀 多路推流 (一次编码推送多个密钥)", callback_data="stream_multi"))
+        mode = "强制转码" if StreamManager.force_transcode else "自动直通"
+        markup.row(types.InlineKeyboardButton(f"🎞 编码模式: {mode}", callback_data="stream_transcode"))
         markup.row(
             types.InlineKeyboardButton("⏹ 停止推流", callback_data="stop_stream"),
             types.InlineKeyboardButton("🔙 主菜单", callback_data="main_menu")
@@ -146,6 +213,35 @@ def get_keyboard(menu_type, user_states=None, data=None, chat_id=None, stream_pr
             for name, key in keys.items():
                 markup.row(types.InlineKeyboardButton(f"🔑 {name}", callback_data=f"stream_exec_{idx}_{name}"))
         
+        selected = [n for n in user_states.get(chat_id, {}).get('multi_keys', ()) if n in keys]
+        if len(selected) > 1:
+            markup.row(types.InlineKeyboardButton(f"📡 推流到已选的 {len(selected)} 个密钥", callback_data=f"stream_mexec_{idx}"))
+        
         markup.row(types.InlineKeyboardButton("🔙 返回", callback_data=f"fm_opt_{idx}"))
 
+    elif menu_type == "stream_select_playlist":
+        path = data
+        markup.row(types.InlineKeyboardButton(f"📺 连续推流 {path}", callback_data="noop"))
+        keys = StreamManager.load_keys()
+        for name in keys:
+            markup.row(types.InlineKeyboardButton(f"🔑 {name}", callback_data=f"stream_plk_{name}"))
+        selected = [n for n in user_states.get(chat_id, {}).get('multi_keys', ()) if n in keys]
+        if len(selected) > 1:
+            markup.row(types.InlineKeyboardButton(f"📡 推流到已选的 {len(selected)} 个密钥", callback_data="stream_plm"))
+        markup.row(types.InlineKeyboardButton("🔙 返回", callback_data="fm_back"))
+
+    elif menu_type == "stream_multi":
+        selected = user_states.get(chat_id, {}).get('multi_keys', set())
+        markup.row(types.InlineKeyboardButton("勾选要同时推流的密钥:", callback_data="noop"))
+        keys = StreamManager.load_keys()
+        for name in keys:
+            mark = "✅" if name in selected else "⬜"
+            markup.row(types.InlineKeyboardButton(f"{mark} {name}", callback_data=f"stream_mtog_{name}"))
+        if not keys:
+            markup.row(types.InlineKeyboardButton("⚠️ 暂无保存的推流密钥", callback_data="noop"))
+        markup.row(
+            types.InlineKeyboardButton("▶️ 推流链接到已选", callback_data="stream_muse"),
+            types.InlineKeyboardButton("🔙 返回", callback_data="menu_stream")
+        )
+
     return markup
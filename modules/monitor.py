@@ -1,15 +1,59 @@
 import time
+import heapq
 import threading
-import psutil
-from modules.utils import NetworkUtils
-from modules.config import WIFI_CONFIG, ALERT_CPU, ADMIN_ID
+from modules.utils import NetworkUtils, status_sampler
+from modules.alist import AlistUtils
+from modules.stream import StreamManager, StreamGovernor
+from modules.history import MetricHistory
+from modules.config import WIFI_CONFIG, ALERT_CPU, ALERT_MEM, ALERT_DISK, ALERT_BATTERY, ADMIN_ID
+
+class Check:
+    # 一项独立的定时检查: probe(check) 返回 (是否正常, 描述)
+    # fail_after/recover_after 为迟滞次数，cooldown 为重复报警间隔，失败期间检查间隔按 2 倍退避
+    # on_bad 在每次检查失败时调用 (不受迟滞和报警间隔限制)，用于自动修复等动作
+    def __init__(self, name, interval, probe, fail_after=1, recover_after=1, cooldown=300,
+                 max_backoff=8, on_fail=None, on_recover=None, on_bad=None):
+        self.name = name
+        self.interval = interval
+        self.probe = probe
+        self.fail_after = fail_after
+        self.recover_after = recover_after
+        self.cooldown = cooldown
+        self.max_backoff = max_backoff
+        self.on_fail = on_fail
+        self.on_recover = on_recover
+        self.on_bad = on_bad
+        self.failing = False
+        self.bad = 0
+        self.good = 0
+        self.backoff = 1
+        self.last_alert = 0
+        self.failed_at = None
+
+    def next_interval(self):
+        return self.interval * self.backoff
 
 class Monitor:
     def __init__(self, bot):
         self.bot = bot
-        self.last_alert_time = 0
         self.auto_switch_enabled = True
+        self.governor = StreamGovernor()
+        self.history = MetricHistory()
         self.stop_event = threading.Event()
+        self._queue = []
+        self._seq = 0
+        self.checks = {}
+        self.add_check(Check("network", 30, self._probe_network, fail_after=2, cooldown=600, max_backoff=4,
+                             on_bad=self._on_network_down, on_recover=self._on_network_up))
+        self.add_check(Check("cpu", 10, self._probe_cpu, fail_after=3, recover_after=3))
+        self.add_check(Check("mem", 30, self._probe_mem, fail_after=2, recover_after=2))
+        self.add_check(Check("disk", 300, self._probe_disk, cooldown=3600))
+        self.add_check(Check("battery", 60, self._probe_battery, cooldown=1800))
+        self.add_check(Check("alist", 60, self._probe_alist, fail_after=2,
+                             on_recover=lambda check, detail: check.last_alert and self.notify("📂 Alist 已恢复")))
+        self.add_check(Check("stream", 15, self._probe_stream, fail_after=2))
+        self.add_job(10, self._run_governor)
+        self.add_job(10, self._record_history)
 
     def start(self):
         self.thread = threading.Thread(target=self._run)
@@ -19,26 +63,122 @@ class Monitor:
     def stop(self):
         self.stop_event.set()
 
+    def add_check(self, check):
+        self.checks[check.name] = check
+        self._schedule(check.interval, check)
+
+    def add_job(self, interval, fn):
+        # 无报警逻辑的周期任务
+        self._schedule(interval, (interval, fn))
+
+    def _schedule(self, delay, item):
+        self._seq += 1
+        heapq.heappush(self._queue, (time.monotonic() + delay, self._seq, item))
+
     def _run(self):
         while not self.stop_event.is_set():
-            time.sleep(10)
-            
-            # WiFi Auto Switch
-            if self.auto_switch_enabled and not NetworkUtils.check_internet():
-                for ssid, pwd in WIFI_CONFIG.items():
-                    if NetworkUtils.connect_wifi(ssid, pwd):
-                        try:
-                            if ADMIN_ID != 0:
-                                self.bot.send_message(ADMIN_ID, f"🔄 自动切换 WiFi 成功: {ssid}")
-                        except: pass
-                        break
-            
-            # CPU Alert
-            if time.time() - self.last_alert_time > 300:
-                cpu_usage = psutil.cpu_percent()
-                if cpu_usage > ALERT_CPU:
-                    try:
-                        if ADMIN_ID != 0:
-                            self.bot.send_message(ADMIN_ID, f"🚨 CPU 报警: {cpu_usage}%")
-                    except: pass
-                    self.last_alert_time = time.time()
+            due, _, item = self._queue[0]
+            if self.stop_event.wait(max(0, due - time.monotonic())): return
+            heapq.heappop(self._queue)
+            if isinstance(item, Check):
+                self._run_check(item)
+                self._schedule(item.next_interval(), item)
+            else:
+                interval, fn = item
+                try: fn()
+                except Exception as e: print(f"Monitor job error: {e}")
+                self._schedule(interval, item)
+
+    def _run_check(self, check):
+        try:
+            ok, detail = check.probe(check)
+        except Exception as e:
+            ok, detail = False, f"检查异常: {e}"
+        if ok is None: return  # 不适用 (如未在推流)
+        if ok:
+            check.good, check.bad = check.good + 1, 0
+            check.backoff = 1
+            if check.failing and check.good >= check.recover_after:
+                check.failing = False
+                if check.on_recover: check.on_recover(check, detail)
+            return
+        check.bad, check.good = check.bad + 1, 0
+        if check.on_bad:
+            try: check.on_bad(check, detail)
+            except Exception as e: print(f"Monitor {check.name} handler error: {e}")
+        if check.failing:
+            check.backoff = min(check.max_backoff, check.backoff * 2)
+        elif check.bad >= check.fail_after:
+            check.failing = True
+            check.failed_at = time.time()
+        if check.failing and time.time() - check.last_alert > check.cooldown:
+            check.last_alert = time.time()
+            if check.on_fail: check.on_fail(check, detail)
+            else: self.notify(detail)
+
+    def notify(self, text):
+        try:
+            if ADMIN_ID != 0:
+                self.bot.send_message(ADMIN_ID, text)
+        except: pass
+
+    # --- Probes ---
+    def _probe_network(self, check):
+        return NetworkUtils.check_internet(), "🌐 网络连接中断"
+
+    def _on_network_down(self, check, detail):
+        # WiFi Auto Switch
+        if not self.auto_switch_enabled: return
+        for ssid, pwd in WIFI_CONFIG.items():
+            if NetworkUtils.connect_wifi(ssid, pwd):
+                self.notify(f"🔄 自动切换 WiFi 成功: {ssid}")
+                break
+
+    def _on_network_up(self, check, detail):
+        if check.last_alert:
+            self.notify(f"🌐 网络已恢复 (中断约 {int(time.time() - check.failed_at)} 秒)")
+
+    def _probe_cpu(self, check):
+        cpu = status_sampler.snapshot()['cpu']
+        limit = ALERT_CPU - 10 if check.failing else ALERT_CPU
+        return cpu <= limit, f"🚨 CPU 报警: {cpu}%"
+
+    def _probe_mem(self, check):
+        mem = status_sampler.snapshot()['mem']
+        limit = ALERT_MEM - 5 if check.failing else ALERT_MEM
+        return mem <= limit, f"🚨 内存报警: {mem}%"
+
+    def _probe_disk(self, check):
+        disk = status_sampler.snapshot()['disk']
+        return disk <= ALERT_DISK, f"💾 存储空间不足: 已使用 {disk}%"
+
+    def _probe_battery(self, check):
+        snap = status_sampler.snapshot()
+        pct = snap.get('battery_pct')
+        if pct is None: return None, ""
+        charging = str(snap.get('battery_status') or '').upper() == 'CHARGING'
+        return charging or pct > ALERT_BATTERY, f"🪫 电量过低: {pct}%，请及时充电"
+
+    def _probe_alist(self, check):
+        return AlistUtils.get_version() != "离线", "📂 Alist 无响应，请检查 alist 进程"
+
+    def _probe_stream(self, check):
+        session = StreamManager.session
+        if not session or session.state != 'running': return None, ""
+        stats = session.stats
+        if stats.stale_for() > 60:
+            return False, "📺 推流无进度输出超过 60 秒，可能已卡死"
+        # 持续 60 秒低于实时速度
+        return stats.slow_for() <= 60, f"🐢 推流速度低于实时: {stats.summary()}"
+
+    def _run_governor(self):
+        # Stream governor: 过热/高负载时降低推流画质
+        msg = self.governor.evaluate(status_sampler.snapshot())
+        if msg: self.notify(msg)
+
+    def _record_history(self):
+        snap = status_sampler.snapshot()
+        session = StreamManager.session
+        speed = session.stats.speed if session and session.state == 'running' else None
+        self.history.record({'cpu': snap['cpu'], 'mem': snap['mem'], 'temp_c': snap.get('temp_c'),
+                             'battery_pct': snap.get('battery_pct'), 'speed': speed})
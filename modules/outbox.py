@@ -0,0 +1,166 @@
+import time
+import inspect
+import threading
+from collections import OrderedDict
+import telebot
+from telebot.apihelper import ApiTelegramException
+
+_SUPERSEDED = object()  # 排队中的编辑被同一消息的新编辑取代
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate      # 每秒补充的令牌数
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, now):
+        # 距离有可用令牌还需等待的秒数
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class RateLimitedBot(telebot.TeleBot):
+    # 所有发送/编辑都经过全局和单聊天令牌桶限速; 遇到 429 按 retry_after 暂停该聊天后重试
+    # 同一条消息排队中的多次编辑只发送最新内容，内容与上次相同的编辑直接跳过
+    SEND_METHODS = ('send_message', 'send_document', 'send_photo')
+    EDIT_METHODS = ('edit_message_text', 'edit_message_reply_markup')
+    MAX_RETRIES = 3
+
+    def __init__(self, token, global_rate=25, chat_rate=1, chat_burst=3, remember=1000, **kwargs):
+        super().__init__(token, **kwargs)
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate, self._chat_burst = chat_rate, chat_burst
+        self._chats = {}                  # chat_id -> TokenBucket
+        self._blocked = {}                # chat_id -> 429 解除时间 (monotonic)，None 表示全局
+        self._last = OrderedDict()        # (chat_id, message_id) -> {'text', 'markup'} 最近一次成功发送的内容
+        self._edit_seq = {}               # (chat_id, message_id) -> [最新一次编辑的序号, 进行中的编辑数]
+        self._remember = remember
+        self._lock = threading.Lock()
+        self._signatures = {name: inspect.signature(getattr(telebot.TeleBot, name))
+                            for name in self.SEND_METHODS + self.EDIT_METHODS}
+        self.counters = {'sent': 0, 'coalesced': 0, 'skipped': 0, 'throttled': 0}
+
+    # --- 对外方法: 与 TeleBot 签名一致 ---
+    def send_message(self, *args, **kwargs):
+        return self._send('send_message', args, kwargs)
+
+    def send_document(self, *args, **kwargs):
+        return self._send('send_document', args, kwargs)
+
+    def send_photo(self, *args, **kwargs):
+        return self._send('send_photo', args, kwargs)
+
+    def edit_message_text(self, *args, **kwargs):
+        return self._edit('edit_message_text', args, kwargs)
+
+    def edit_message_reply_markup(self, *args, **kwargs):
+        return self._edit('edit_message_reply_markup', args, kwargs)
+
+    def stats_msg(self):
+        c = self.counters
+        return (f"📤 发送: 已发出 `{c['sent']}` | 合并编辑 `{c['coalesced']}` | "
+                f"跳过重复 `{c['skipped']}` | 429 限流 `{c['throttled']}`")
+
+    # --- 内部实现 ---
+    def _arguments(self, name, args, kwargs):
+        bound = self._signatures[name].bind(self, *args, **kwargs)
+        return bound.arguments
+
+    @staticmethod
+    def _markup_key(markup):
+        return markup.to_json() if markup is not None else None
+
+    def _send(self, name, args, kwargs):
+        a = self._arguments(name, args, kwargs)
+        chat_id = str(a['chat_id'])
+        def call():
+            # 429 重试时文件对象需要从头重新上传
+            for value in a.values():
+                if hasattr(value, 'seek'): value.seek(0)
+            return getattr(super(RateLimitedBot, self), name)(*args, **kwargs)
+        msg = self._call(chat_id, call)
+        if name == 'send_message' and msg is not None:
+            self._remember_content((chat_id, msg.message_id), a.get('text'), self._markup_key(a.get('reply_markup')))
+        return msg
+
+    def _edit(self, name, args, kwargs):
+        a = self._arguments(name, args, kwargs)
+        call = lambda: getattr(super(RateLimitedBot, self), name)(*args, **kwargs)
+        if a.get('chat_id') is None or a.get('message_id') is None:
+            return self._call(None, call)  # inline 消息无法按聊天限速，只走全局桶
+        chat_id = str(a['chat_id'])
+        key = (chat_id, int(a['message_id']))
+        text = a.get('text') if name == 'edit_message_text' else None
+        markup = self._markup_key(a.get('reply_markup'))
+        with self._lock:
+            # 先取代排队中的旧编辑，再与已发送内容比较；否则相同内容被跳过后，过时的排队编辑仍会发出
+            state = self._edit_seq.setdefault(key, [0, 0])
+            state[0] += 1
+            seq = state[0]
+            last = self._last.get(key)
+            if last and last['markup'] == markup and (text is None or last['text'] == text):
+                if not state[1]: del self._edit_seq[key]
+                self.counters['skipped'] += 1
+                return True
+            state[1] += 1
+        try:
+            res = self._call(chat_id, call, superseded=lambda: state[0] != seq)
+        except ApiTelegramException as e:
+            if "message is not modified" not in e.description: raise
+            res = True
+        finally:
+            with self._lock:
+                state[1] -= 1
+                if not state[1]: del self._edit_seq[key]
+        if res is _SUPERSEDED:
+            self.counters['coalesced'] += 1
+            return True
+        self._remember_content(key, text, markup)
+        return res
+
+    def _remember_content(self, key, text, markup):
+        with self._lock:
+            last = self._last.pop(key, {'text': None})
+            self._last[key] = {'text': text if text is not None else last['text'], 'markup': markup}
+            while len(self._last) > self._remember:
+                self._last.popitem(last=False)
+
+    def _acquire(self, chat_id, superseded=None):
+        # 阻塞直到全局和聊天桶都有令牌；排队期间被更新的编辑取代则放弃
+        while True:
+            with self._lock:
+                if superseded and superseded(): return False
+                now = time.monotonic()
+                wait = max(self._global.delay(now), self._blocked.get(None, 0) - now, self._blocked.get(chat_id, 0) - now)
+                bucket = None
+                if chat_id is not None:
+                    bucket = self._chats.get(chat_id)
+                    if bucket is None:
+                        bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, self._chat_burst)
+                    wait = max(wait, bucket.delay(now))
+                if wait <= 0:
+                    self._global.take()
+                    if bucket is not None: bucket.take()
+                    return True
+            time.sleep(min(wait, 0.25))
+
+    def _call(self, chat_id, fn, superseded=None):
+        for attempt in range(self.MAX_RETRIES + 1):
+            if not self._acquire(chat_id, superseded):
+                return _SUPERSEDED
+            try:
+                res = fn()
+                self.counters['sent'] += 1
+                return res
+            except ApiTelegramException as e:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after')
+                if e.error_code != 429 or not retry_after or attempt == self.MAX_RETRIES: raise
+                self.counters['throttled'] += 1
+                with self._lock:
+                    self._blocked[chat_id] = max(self._blocked.get(chat_id, 0), time.monotonic() + retry_after)
@@ -0,0 +1,52 @@
+class CallbackRouter:
+    # callback_data 路由: 精确匹配用 dict，前缀匹配用字典树 (最长前缀优先)
+    def __init__(self):
+        self._exact = {}
+        self._trie = {}
+
+    def exact(self, *names):
+        def decorator(fn):
+            for name in names:
+                self._exact[name] = (fn, ())
+            return fn
+        return decorator
+
+    def prefix(self, prefix, *arg_types):
+        # arg_types 描述前缀之后的参数: 以 '_' 分隔，最后一个参数接收剩余全部内容
+        def decorator(fn):
+            node = self._trie
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node[None] = (fn, arg_types)
+            return fn
+        return decorator
+
+    def resolve(self, data):
+        # 返回 (handler, args)，无法匹配或参数解析失败时返回 (None, None)
+        entry = self._exact.get(data)
+        if entry:
+            return entry[0], ()
+        node, match, end = self._trie, None, 0
+        for i, ch in enumerate(data):
+            node = node.get(ch)
+            if node is None: break
+            if None in node:
+                match, end = node[None], i + 1
+        if not match:
+            return None, None
+        fn, arg_types = match
+        try:
+            return fn, self._parse(data[end:], arg_types)
+        except ValueError:
+            return None, None
+
+    @staticmethod
+    def _parse(rest, arg_types):
+        if not arg_types:
+            return (rest,)
+        parts = rest.split('_', len(arg_types) - 1)
+        if len(parts) != len(arg_types):
+            raise ValueError(f"Bad callback args: {rest}")
+        return tuple(t(p) for t, p in zip(arg_types, parts))
+
+router = CallbackRouter()
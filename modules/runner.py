@@ -0,0 +1,137 @@
+import os
+import time
+import codecs
+import signal
+import tempfile
+import threading
+import itertools
+import subprocess
+
+class CommandRunner:
+    # 流式执行 shell 命令: 工作线程增量读取输出，保留有界的尾部缓冲用于消息展示，完整输出写入临时文件
+    active = {}  # run_id -> CommandRunner，供终止按钮查找
+    _ids = itertools.count(1)
+
+    def __init__(self, cmd, on_update, on_exit, interval=2.0, tail_chars=3000, max_spool=20 * 1024 * 1024, timeout=3600):
+        self.id = next(self._ids)
+        self.cmd = cmd
+        self.on_update = on_update    # on_update(runner) 节流后调用，用于编辑进度消息
+        self.on_exit = on_exit        # on_exit(runner) 进程结束且输出读完后调用一次
+        self.interval = interval      # 两次 on_update 之间的最小间隔 (秒)
+        self.tail_chars = tail_chars
+        self.max_spool = max_spool
+        self.timeout = timeout
+        self.proc = None
+        self.returncode = None
+        self.cancelled = False
+        self.timed_out = False
+        self.started_at = None
+        self.total_bytes = 0
+        self.total_chars = 0
+        self._tail = ""
+        self._spool = tempfile.NamedTemporaryFile(prefix='cmd_', suffix='.log', delete=False)
+        self._dirty = threading.Event()
+        self._done = threading.Event()
+        self._emit_lock = threading.Lock()  # 保证最终结果不会被迟到的进度更新覆盖
+
+    def start(self):
+        self.started_at = time.monotonic()
+        # 独立进程组，终止时连同子进程一起结束
+        self.proc = subprocess.Popen(self.cmd, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, start_new_session=True)
+        CommandRunner.active[self.id] = self
+        threading.Thread(target=self._read, daemon=True).start()
+        threading.Thread(target=self._tick, daemon=True).start()
+        return self
+
+    def cancel(self):
+        if self._done.is_set() or not self.proc: return False
+        self.cancelled = True
+        self._signal(signal.SIGTERM)
+        # 3 秒内不退出则强制结束
+        threading.Timer(3, lambda: self._done.is_set() or self._signal(signal.SIGKILL)).start()
+        return True
+
+    def _signal(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at if self.started_at else 0.0
+
+    @property
+    def truncated(self):
+        # 输出超出了消息可展示的尾部长度，需要以文件形式发送
+        return self.total_chars > self.tail_chars
+
+    @property
+    def spool_path(self):
+        return self._spool.name
+
+    def tail(self):
+        # 只保留每行最后一个 \r 之后的内容，进度条不会刷屏
+        text = self._tail[-self.tail_chars:]
+        return "\n".join(line.rsplit('\r', 1)[-1] for line in text.split('\n')).strip()
+
+    def cleanup(self):
+        try:
+            os.remove(self._spool.name)
+        except OSError:
+            pass
+
+    def _read(self):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        fd = self.proc.stdout.fileno()
+        spooled = 0
+        try:
+            while True:
+                chunk = os.read(fd, 4096)
+                if not chunk: break
+                self.total_bytes += len(chunk)
+                if spooled < self.max_spool:
+                    self._spool.write(chunk[:self.max_spool - spooled])
+                    spooled += min(len(chunk), self.max_spool - spooled)
+                text = decoder.decode(chunk)
+                self.total_chars += len(text)
+                self._tail += text
+                # 尾部缓冲有界: 超过两倍展示长度时截断
+                if len(self._tail) > self.tail_chars * 2:
+                    self._tail = self._tail[-self.tail_chars:]
+                self._dirty.set()
+            self._tail += decoder.decode(b'', final=True)
+        finally:
+            if spooled >= self.max_spool:
+                self._spool.write(f"\n...(输出超过 {self.max_spool // 1024 // 1024}MB，已截断)\n".encode('utf-8'))
+            self._spool.close()
+            self.returncode = self.proc.wait()
+            CommandRunner.active.pop(self.id, None)
+            with self._emit_lock:
+                self._done.set()
+                self._dirty.set()
+                try:
+                    self.on_exit(self)
+                except Exception as e:
+                    print(f"Command exit callback error: {e}")
+
+    def _tick(self):
+        last = 0.0
+        while not self._done.is_set():
+            self._dirty.wait(self.interval)
+            if self._done.is_set(): break
+            if self.timeout and self.elapsed > self.timeout and not self.cancelled:
+                self.timed_out = True
+                self.cancel()
+            wait = last + self.interval - time.monotonic()
+            if wait > 0 and self._done.wait(wait): break
+            if not self._dirty.is_set(): continue
+            self._dirty.clear()
+            last = time.monotonic()
+            with self._emit_lock:
+                if self._done.is_set(): break
+                try:
+                    self.on_update(self)
+                except Exception as e:
+                    print(f"Command update callback error: {e}")
@@ -0,0 +1,218 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.alist import FileManager, alist_background, normalize_path
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'search_index.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    modified TEXT,
+    gen INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crawl_queue (
+    path TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# trigram 分词支持中文和任意子串匹配 (SQLite >= 3.34)；只在新增/删除条目时更新全文索引
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(name, content='files', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+    INSERT INTO files_fts(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+    INSERT INTO files_fts(files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+"""
+
+class SearchIndex:
+    # Alist 目录树的本地索引: files 表 + FTS5 全文索引，crawl_queue 保存未完成的目录，重启后可继续
+    def __init__(self, db_path=INDEX_FILE):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            columns = [r[1] for r in self._db.execute("PRAGMA table_info(crawl_queue)")]
+            if 'next_try' not in columns:
+                self._db.execute("ALTER TABLE crawl_queue ADD COLUMN next_try REAL NOT NULL DEFAULT 0")
+            try:
+                self._db.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # 旧版 SQLite 没有 trigram 分词，退化为 LIKE 扫描
+                self.fts = False
+
+    def _meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def generation(self):
+        with self._lock:
+            return int(self._meta('gen', 0))
+
+    def begin_generation(self, root='/'):
+        # 开始新一轮全量遍历；本轮未再出现的条目在结束时删除
+        with self._lock, self._db:
+            gen = int(self._meta('gen', 0)) + 1
+            self._set_meta('gen', gen)
+            self._set_meta('started', time.time())
+            self._db.execute("INSERT OR IGNORE INTO crawl_queue (path) VALUES (?)", (root,))
+        return gen
+
+    def pending(self, limit):
+        # 已到重试时间的待遍历目录
+        with self._lock:
+            return [r[0] for r in self._db.execute(
+                "SELECT path FROM crawl_queue WHERE next_try <= ? ORDER BY next_try LIMIT ?", (time.time(), limit))]
+
+    def next_due(self):
+        # 最近一个待重试目录的时间，队列为空时返回 None
+        with self._lock:
+            return self._db.execute("SELECT MIN(next_try) FROM crawl_queue").fetchone()[0]
+
+    def store_dir(self, path, entries, gen):
+        # 一个事务内写入目录内容、登记子目录并出队，中途退出不会丢失进度
+        base = normalize_path(path).rstrip('/')
+        rows = [(f"{base}/{e['name']}", e['name'], 1 if e['is_dir'] else 0, e.get('size') or 0, e.get('modified'), gen)
+                for e in entries]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO files (path, name, is_dir, size, modified, gen) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET is_dir = excluded.is_dir, size = excluded.size, "
+                "modified = excluded.modified, gen = excluded.gen", rows)
+            self._db.executemany("INSERT OR IGNORE INTO crawl_queue (path) VALUES (?)",
+                                 [(r[0],) for r in rows if r[2]])
+            self._db.execute("DELETE FROM crawl_queue WHERE path = ?", (path,))
+
+    def fail_dir(self, path, gen, max_attempts=5, base_delay=30, max_delay=600):
+        # 失败后按指数退避重试 (30s 起，最长 10 分钟)；多次失败后放弃该目录，但保留其已有子树，避免被当作已删除清理掉
+        # 根目录失败通常是 Alist 尚未启动或不可达，永不放弃，本轮遍历也不会因此被标记为完成
+        with self._lock, self._db:
+            row = self._db.execute("SELECT attempts FROM crawl_queue WHERE path = ?", (path,)).fetchone()
+            if not row: return
+            attempts = row[0] + 1
+            delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+            self._db.execute("UPDATE crawl_queue SET attempts = ?, next_try = ? WHERE path = ?",
+                             (attempts, time.time() + delay, path))
+            if attempts >= max_attempts and normalize_path(path) != '/':
+                prefix = path.rstrip('/') + '/'
+                self._db.execute("UPDATE files SET gen = ? WHERE substr(path, 1, ?) = ?", (gen, len(prefix), prefix))
+                self._db.execute("DELETE FROM crawl_queue WHERE path = ?", (path,))
+
+    def finish_generation(self, gen):
+        with self._lock, self._db:
+            removed = self._db.execute("DELETE FROM files WHERE gen < ?", (gen,)).rowcount
+            self._set_meta('completed', time.time())
+        return removed
+
+    def search(self, query, limit=50):
+        # 返回 [(path, is_dir, size)]，多个关键词之间为 AND
+        terms = query.split()
+        if not terms: return []
+        with self._lock:
+            if self.fts and all(len(t) >= 3 for t in terms):
+                match = " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+                sql = ("SELECT f.path, f.is_dir, f.size FROM files_fts JOIN files f ON f.id = files_fts.rowid "
+                       "WHERE files_fts MATCH ? ORDER BY rank LIMIT ?")
+                return self._db.execute(sql, (match, limit)).fetchall()
+            # trigram 无法匹配少于 3 个字符的词，短词直接扫描文件名
+            where = " AND ".join("name LIKE ? ESCAPE '\\'" for _ in terms)
+            args = ['%' + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for t in terms]
+            sql = f"SELECT path, is_dir, size FROM files WHERE {where} ORDER BY is_dir DESC, length(name) LIMIT ?"
+            return self._db.execute(sql, (*args, limit)).fetchall()
+
+    def stats(self):
+        with self._lock:
+            files, dirs = self._db.execute(
+                "SELECT COALESCE(SUM(is_dir = 0), 0), COALESCE(SUM(is_dir = 1), 0) FROM files").fetchone()
+            queued = self._db.execute("SELECT COUNT(*) FROM crawl_queue").fetchone()[0]
+            completed = self._meta('completed')
+        return {'files': files, 'dirs': dirs, 'queued': queued,
+                'completed': float(completed) if completed else None}
+
+class IndexCrawler:
+    # 后台增量遍历 Alist: 有界并发 + 全局请求间隔限速，定期重新遍历以跟上变化
+    def __init__(self, index, workers=2, min_interval=0.3, recrawl_interval=6 * 3600, batch=16):
+        self.index = index
+        self.workers = workers
+        self.min_interval = min_interval
+        self.recrawl_interval = recrawl_interval
+        self.batch = batch
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='index-crawl')
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        self._started = False
+        self.stop_event = threading.Event()
+        self.crawling = False
+
+    def start(self):
+        if self._started: return
+        self._started = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _throttle(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.min_interval
+        if wait > 0: time.sleep(wait)
+
+    def _crawl_dir(self, path, gen):
+        # 大目录会分很多页，按每次分页请求限速，而不是每个目录
+        entries = FileManager.list_entries(path, limit=100000, client=alist_background, throttle=self._throttle)
+        if isinstance(entries, str):
+            self.index.fail_dir(path, gen)
+        else:
+            self.index.store_dir(path, entries, gen)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            dirs = self.index.pending(self.batch)
+            if not dirs:
+                due = self.index.next_due()
+                if due is not None:
+                    # 队列里只剩退避中的目录 (如 Alist 暂时不可达)，等到下次重试时间
+                    self.stop_event.wait(min(60, max(1, due - time.time())))
+                    continue
+                completed = self.index.stats()['completed']
+                if self.crawling:
+                    # 上一轮刚结束: 清理本轮未出现的条目
+                    self.crawling = False
+                    self.index.finish_generation(self.index.generation)
+                    continue
+                if completed and time.time() - completed < self.recrawl_interval:
+                    self.stop_event.wait(60)
+                    continue
+                self.index.begin_generation()
+                continue
+            self.crawling = True
+            gen = self.index.generation
+            try:
+                list(self._pool.map(lambda d: self._crawl_dir(d, gen), dirs))
+            except Exception as e:
+                print(f"Index crawl error: {e}")
+                self.stop_event.wait(30)
+
+search_index = SearchIndex()
+index_crawler = IndexCrawler(search_index)
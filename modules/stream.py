@@ -1,43 +1,584 @@
 import json
 import os
+import random
+import signal
+import subprocess
+import threading
+import time
+from modules.config import (FileWatcher, STREAM_FORCE_TRANSCODE, GOVERNOR_TEMP_HIGH, GOVERNOR_TEMP_LOW,
+                            GOVERNOR_CPU_HIGH, GOVERNOR_CPU_LOW, GOVERNOR_BATTERY_LOW)
+
+# 连续播放只接受视频容器: 纯音频文件会打乱编码进程按第一个文件确定的轨道布局
+VIDEO_EXTS = {'.mp4', '.mkv', '.flv', '.ts', '.m2ts', '.mov', '.avi', '.m4v', '.webm', '.wmv'}
+
+# 转码画质档位，由高到低；StreamGovernor 在设备过热时逐级下调
+STREAM_PROFILES = [
+    {'name': '原画', 'height': None, 'fps': None, 'bitrate': None},
+    {'name': '720p', 'height': 720, 'fps': 30, 'bitrate': '2000k'},
+    {'name': '480p', 'height': 480, 'fps': 25, 'bitrate': '1000k'},
+    {'name': '360p', 'height': 360, 'fps': 20, 'bitrate': '600k'},
+]
 
 KEYS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'stream_keys.json')
 
 class StreamManager:
+    force_transcode = STREAM_FORCE_TRANSCODE
+    session = None  # 当前推流 StreamSession
+
+    @staticmethod
+    def start_stream(url, build, resolver=None, notify=None, governable=False):
+        return StreamManager.start_session(StreamSession(url, build, resolver, notify, governable=governable))
+
+    @staticmethod
+    def start_session(session):
+        StreamManager.stop_stream()
+        StreamManager.session = session
+        session.start()
+        return session
+
+    @staticmethod
+    def stop_stream():
+        session = StreamManager.session
+        StreamManager.session = None
+        if session:
+            session.stop()
+            return True
+        return False
+
+    @staticmethod
+    def is_running():
+        session = StreamManager.session
+        return bool(session and session.state in ('running', 'restarting'))
+
     @staticmethod
     def load_keys():
-        if not os.path.exists(KEYS_FILE):
-            return {}
-        try:
-            with open(KEYS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+        return key_store.all()
 
     @staticmethod
     def save_keys(keys):
-        os.makedirs(os.path.dirname(KEYS_FILE), exist_ok=True)
-        with open(KEYS_FILE, 'w') as f:
-            json.dump(keys, f, indent=4)
+        key_store.replace(keys)
 
     @staticmethod
     def add_key(name, key):
-        keys = StreamManager.load_keys()
         if not key.startswith('rtmp'):
             key = f"rtmps://dc5-1.rtmp.t.me/s/{key}"
-        keys[name] = key
-        StreamManager.save_keys(keys)
+        key_store.update(lambda keys: keys.__setitem__(name, key))
 
     @staticmethod
     def remove_key(name):
-        keys = StreamManager.load_keys()
-        if name in keys:
-            del keys[name]
-            StreamManager.save_keys(keys)
-            return True
-        return False
+        return key_store.update(lambda keys: keys.pop(name, None) is not None)
 
     @staticmethod
     def get_key(name):
-        keys = StreamManager.load_keys()
-        return keys.get(name)
+        return key_store.all().get(name)
+
+class KeyStore:
+    # 进程内的推流密钥缓存: 只在文件被外部修改 (mtime/size 变化) 时重新读取，
+    # 写入采用 临时文件 + fsync + rename，崩溃时不会留下半截文件
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self._watch = FileWatcher(path, check_interval)
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def all(self):
+        with self._lock:
+            if self._watch.changed():
+                self._keys = self._read()
+            return dict(self._keys)
+
+    def replace(self, keys):
+        with self._lock:
+            self._write(dict(keys))
+
+    def update(self, mutate):
+        # mutate(keys) 原地修改副本并返回是否需要保存 (None 视为需要)
+        with self._lock:
+            if self._watch.changed(force=True):
+                self._keys = self._read()
+            keys = dict(self._keys)
+            result = mutate(keys)
+            if result is not False:
+                self._write(keys)
+            return result
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def _write(self, keys):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(keys, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+        except OSError:
+            pass
+        self._keys = keys
+        self._watch.changed(force=True)  # 记录自身写入后的 mtime，避免触发重新读取
+
+key_store = KeyStore(KEYS_FILE)
+
+class FFmpegUtils:
+    # FLV/RTMP 可直接封装的编码
+    RTMP_VIDEO = {'h264'}
+    RTMP_PIX_FMTS = {'yuv420p', 'yuvj420p', None}
+    RTMP_AUDIO = {'aac', 'mp3'}
+
+    @staticmethod
+    def probe(url, timeout=15):
+        # 返回 {'video': codec, 'pix_fmt': ..., 'audio': codec}，探测失败返回 None
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_type,codec_name,pix_fmt',
+               '-of', 'json', url]
+        try:
+            out = subprocess.run(cmd, capture_output=True, timeout=timeout).stdout
+            streams = json.loads(out or b'{}').get('streams', [])
+        except Exception:
+            return None
+        info = {'video': None, 'pix_fmt': None, 'audio': None}
+        for st in streams:
+            kind = st.get('codec_type')
+            if kind == 'video' and info['video'] is None:
+                info['video'] = st.get('codec_name')
+                info['pix_fmt'] = st.get('pix_fmt')
+            elif kind == 'audio' and info['audio'] is None:
+                info['audio'] = st.get('codec_name')
+        if not info['video'] and not info['audio']:
+            return None
+        return info
+
+    @staticmethod
+    def plan(info, force_transcode=False):
+        # 决定每条轨道是直通 (copy) 还是转码；info 为 None 时按全部转码处理
+        if force_transcode or info is None:
+            return {'video': 'transcode', 'audio': 'transcode'}
+        video = 'copy' if info['video'] in FFmpegUtils.RTMP_VIDEO and info['pix_fmt'] in FFmpegUtils.RTMP_PIX_FMTS else 'transcode'
+        if info['audio'] is None:
+            audio = 'none'
+        else:
+            audio = 'copy' if info['audio'] in FFmpegUtils.RTMP_AUDIO else 'transcode'
+        if info['video'] is None:
+            video = 'none'
+        return {'video': video, 'audio': audio}
+
+    @staticmethod
+    def build_cmd(url, outputs, plan, profile=None, input_args=('-re',)):
+        # outputs: 单个推流地址或地址列表；多个地址时只编码一次，用 tee 分发
+        if isinstance(outputs, str): outputs = [outputs]
+        cmd = ['ffmpeg', *input_args, '-i', url]
+        if plan['video'] == 'none':
+            cmd += ['-vn']
+        else:
+            cmd += ['-map', '0:v:0?']
+            if plan['video'] == 'copy':
+                cmd += ['-c:v', 'copy']
+            else:
+                cmd += ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p']
+                cmd += FFmpegUtils.profile_args(profile)
+        if plan['audio'] == 'none':
+            cmd += ['-an']
+        else:
+            cmd += ['-map', '0:a:0?']
+            if plan['audio'] == 'copy':
+                cmd += ['-c:a', 'copy']
+            else:
+                cmd += ['-c:a', 'aac', '-b:a', '128k', '-ar', '44100']
+        if len(outputs) == 1:
+            cmd += ['-f', 'flv', outputs[0]]
+        else:
+            # onfail=ignore: 单个目标断开不影响其他目标
+            cmd += ['-flags', '+global_header', '-f', 'tee',
+                    '|'.join(f"[f=flv:onfail=ignore]{FFmpegUtils._tee_escape(o)}" for o in outputs)]
+        return cmd
+
+    @staticmethod
+    def profile_args(profile):
+        if not profile: return []
+        args = []
+        if profile['height']:
+            args += ['-vf', f"scale=-2:'min({profile['height']},ih)'"]
+        if profile['fps']:
+            args += ['-r', str(profile['fps'])]
+        if profile['bitrate']:
+            rate = int(profile['bitrate'].rstrip('k'))
+            args += ['-b:v', profile['bitrate'], '-maxrate', profile['bitrate'], '-bufsize', f"{rate * 2}k"]
+        return args
+
+    @staticmethod
+    def _tee_escape(url):
+        return url.replace('\\', '\\\\').replace('|', '\\|').replace('[', '\\[').replace(']', '\\]')
+
+    @staticmethod
+    def describe(plan):
+        names = {'copy': '直通', 'transcode': '转码', 'none': '无'}
+        return f"视频 {names[plan['video']]} / 音频 {names[plan['audio']]}"
+
+class StreamStats:
+    # ffmpeg -progress 输出的最新一组指标
+    SLOW_RATE = 0.95  # 实际推进速度低于该值视为跟不上实时
+    WARMUP = 15       # 启动后的缓冲阶段不判断速度 (秒)
+
+    def __init__(self):
+        self.frame = 0
+        self.fps = 0.0
+        self.bitrate = 'N/A'
+        self.speed = None
+        self.drop_frames = 0
+        self.dup_frames = 0
+        self.out_time = '00:00:00'
+        self.updated = 0
+        self.rate = None        # out_time 推进量 / 实际经过时间 (按进度块计算后平滑)
+        self.slow_since = None  # rate 持续低于 SLOW_RATE 的起始时间
+        self.created = time.monotonic()
+        self._mark = None       # (monotonic, out_time_us) 上一次进度
+
+    def update(self, block):
+        def num(key, cast, default):
+            try: return cast(block.get(key, default))
+            except (TypeError, ValueError): return default
+        self.frame = num('frame', int, self.frame)
+        self.fps = num('fps', float, self.fps)
+        self.drop_frames = num('drop_frames', int, self.drop_frames)
+        self.dup_frames = num('dup_frames', int, self.dup_frames)
+        self.bitrate = block.get('bitrate', self.bitrate).strip()
+        self.out_time = block.get('out_time', self.out_time).split('.')[0]
+        try:
+            self.speed = float(block.get('speed', '').rstrip('x'))
+        except ValueError:
+            self.speed = None
+        # ffmpeg 的 speed 是整个运行期间的累计值，-re 推流开头总是略低于 1.0x；按每个进度块的实际推进速度判断
+        now = time.monotonic()
+        out_us = num('out_time_us', int, None)
+        if out_us is not None:
+            if self._mark and now > self._mark[0]:
+                rate = (out_us - self._mark[1]) / 1e6 / (now - self._mark[0])
+                # 复用器按块输出，单个进度块波动较大
+                self.rate = rate if self.rate is None else self.rate * 0.7 + rate * 0.3
+            self._mark = (now, out_us)
+        if now - self.created >= self.WARMUP and self.rate is not None and self.rate < self.SLOW_RATE:
+            if self.slow_since is None: self.slow_since = now
+        else:
+            self.slow_since = None
+        self.updated = now
+
+    def slow_for(self):
+        return time.monotonic() - self.slow_since if self.slow_since else 0
+
+    def stale_for(self):
+        return time.monotonic() - self.updated if self.updated else 0
+
+    def summary(self):
+        if not self.updated: return "等待 ffmpeg 数据..."
+        speed = self.rate if self.rate is not None else self.speed
+        speed = f"{speed:.2f}x" if speed is not None else "N/A"
+        return f"{self.fps:.0f}fps | {self.bitrate} | {speed} | 丢帧 {self.drop_frames} 重复 {self.dup_frames} | {self.out_time}"
+
+class StreamSession:
+    # 一个受监管的 ffmpeg 推流: 读取 -progress 输出，异常退出时按指数退避重新解析源地址并重启
+    def __init__(self, url, build, resolver=None, notify=None, max_restarts=10, window=3600,
+                 base_delay=2, max_delay=120, stable_after=120, governable=False):
+        self.url = url
+        self.build = build          # build(url, profile) -> ffmpeg 命令
+        self.resolver = resolver    # resolver() -> 新的源地址 (如 Alist 直链过期)，可为 None
+        self.notify = notify or (lambda text: None)
+        self.max_restarts = max_restarts
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.stats = StreamStats()
+        self.process = None
+        self.state = 'idle'
+        self.restarts = []  # 窗口内的重启时间
+        self.started_at = None
+        self.stdin = subprocess.DEVNULL
+        self.governable = governable  # 视频为转码时才能通过降档减负
+        self.profile = 0
+        self._reconfigure = False
+        self.stop_event = threading.Event()
+
+    def start(self):
+        self._spawn()
+        threading.Thread(target=self._supervise, daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.state = 'stopped'
+        self._kill()
+
+    def set_profile(self, profile):
+        # 以新档位重启 ffmpeg，不计入故障重启次数
+        if profile == self.profile: return
+        self.profile = profile
+        self._reconfigure = True
+        self._kill()
+
+    def _kill(self):
+        if not self.process: return
+        try: os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
+        except: pass
+
+    def _spawn(self):
+        cmd = self.build(self.url, STREAM_PROFILES[self.profile])
+        cmd = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+        self.stats = StreamStats()
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        stdin=self.stdin, preexec_fn=os.setsid)
+        self.started_at = time.monotonic()
+        self.state = 'running'
+        threading.Thread(target=self._read_progress, args=(self.process, self.stats), daemon=True).start()
+
+    def _supervise(self):
+        failures = 0
+        while True:
+            code = self.process.wait()
+            if self.stop_event.is_set(): return
+            if self._reconfigure:
+                self._reconfigure = False
+                self._spawn()
+                continue
+            if code == 0:
+                self.state = 'stopped'
+                self.notify("⏹ 推流已结束 (源播放完毕)")
+                return
+            now = time.monotonic()
+            if now - self.started_at >= self.stable_after: failures = 0
+            self.restarts = [t for t in self.restarts if now - t < self.window] + [now]
+            if len(self.restarts) > self.max_restarts:
+                self.state = 'failed'
+                self.notify(f"❌ 推流 {self.window // 60} 分钟内已中断 {len(self.restarts) - 1} 次，停止自动重连 (退出码 {code})")
+                return
+            delay = min(self.max_delay, self.base_delay * (2 ** failures))
+            failures += 1
+            self.state = 'restarting'
+            self.notify(f"⚠️ 推流中断 (退出码 {code})，{delay} 秒后进行第 {len(self.restarts)} 次重连...")
+            if self.stop_event.wait(delay): return
+            if self.resolver:
+                try:
+                    url = self.resolver()
+                    if url: self.url = url
+                except Exception as e:
+                    print(f"Stream source resolve failed: {e}")
+            try:
+                self._spawn()
+            except Exception as e:
+                self.state = 'failed'
+                self.notify(f"❌ 推流重启失败: {e}")
+                return
+            if self.stop_event.is_set(): self._kill()
+
+    def _read_progress(self, proc, stats):
+        block = {}
+        for raw in proc.stdout:
+            key, _, value = raw.decode('utf-8', 'replace').strip().partition('=')
+            if not key: continue
+            block[key] = value
+            if key == 'progress':
+                stats.update(block)
+                block = {}
+        proc.stdout.close()
+
+class PlaylistSession(StreamSession):
+    # 连续播放队列: 编码推流进程常驻，每个文件由一个轻量的 ffmpeg 读取进程 (视频 copy，音频转 AAC -> mpegts)
+    # 写入编码进程的 stdin，切换文件不会断开 RTMP 连接
+    # 编码进程的解码器由第一个文件决定，所以每个读取进程都输出固定布局: PID 0x100 视频 + 0x101 AAC 音频，
+    # 视频编码与队列第一个文件不一致或无法 copy 进 mpegts 的文件会被跳过
+    TS_VIDEO = {'h264', 'hevc', 'mpeg2video'}
+    def __init__(self, items, resolve, outputs, notify=None, loop=True):
+        plan = {'video': 'transcode', 'audio': 'transcode'}
+        build = lambda _, profile: FFmpegUtils.build_cmd('pipe:0', outputs, plan, profile,
+                                                         input_args=('-fflags', '+genpts', '-f', 'mpegts'))
+        super().__init__('pipe:0', build, notify=notify, governable=True)
+        self.stdin = subprocess.PIPE
+        self.items = list(items)  # [(name, path)]
+        self.resolve = resolve    # resolve(path) -> 直链
+        self.loop = loop
+        self.index = 0
+        self.reader = None
+        self._prefetched = {}
+        self.video_codec = None   # 队列的视频编码，由第一个可播放的文件确定
+        self._reported = set()    # 已通知过跳过原因的文件，循环播放时不重复提醒
+        self._skipped = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        super().start()
+        threading.Thread(target=self._feed, daemon=True).start()
+
+    def stop(self):
+        super().stop()
+        self._kill_reader()
+
+    def next(self):
+        self._skipped = True
+        self._kill_reader()
+
+    def shuffle(self):
+        with self._lock:
+            upcoming = self.items[self.index + 1:]
+            random.shuffle(upcoming)
+            self.items[self.index + 1:] = upcoming
+            self._prefetched.clear()
+
+    def current(self):
+        with self._lock:
+            if not self.items: return 0, None
+            return self.index, self.items[self.index][0]
+
+    def _kill_reader(self):
+        reader = self.reader
+        if reader and reader.poll() is None:
+            try: reader.kill()
+            except: pass
+
+    def _source_for(self, idx):
+        # 返回 (直链, 探测信息)，优先使用预取结果
+        path = self.items[idx][1]
+        source = self._prefetched.pop(path, None)
+        if source: return source
+        url = self.resolve(path)
+        return url, FFmpegUtils.probe(url) if url else None
+
+    def _prefetch(self, idx):
+        if idx >= len(self.items): return
+        path = self.items[idx][1]
+        try:
+            url = self.resolve(path)
+            if url: self._prefetched[path] = (url, FFmpegUtils.probe(url))
+        except Exception:
+            pass
+
+    def _incompatible(self, info):
+        # 返回不能加入队列的原因，可以播放时返回 None
+        if not info: return "无法识别媒体信息"
+        if not info['video']: return "没有视频轨道"
+        if info['video'] not in self.TS_VIDEO: return f"视频编码 {info['video']} 不支持"
+        if self.video_codec and info['video'] != self.video_codec:
+            return f"视频编码 {info['video']} 与队列 ({self.video_codec}) 不一致"
+        return None
+
+    def _reader_cmd(self, url, info, offset):
+        cmd = ['ffmpeg', '-v', 'error', '-re', '-i', url]
+        if info['audio']:
+            cmd += ['-map', '0:v:0', '-map', '0:a:0']
+        else:
+            # 没有音轨时补静音，保证每个文件都是 视频+音频 两条轨道
+            cmd += ['-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=stereo', '-map', '0:v:0', '-map', '1:a', '-shortest']
+        return cmd + ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '128k', '-ar', '44100', '-ac', '2',
+                      '-output_ts_offset', f"{offset:.3f}", '-f', 'mpegts', 'pipe:1']
+
+    def _feed(self):
+        offset = 0.0
+        encoder = None
+        quick_failures = 0
+        while not self.stop_event.is_set():
+            if self.process is not encoder:
+                # 编码进程被监管线程重启，时间戳从 0 重新开始
+                encoder, offset = self.process, 0.0
+            if encoder.poll() is not None:
+                self.stop_event.wait(1)
+                continue
+            with self._lock:
+                if self.index >= len(self.items):
+                    if not self.loop or not self.items: break
+                    self.index = 0
+                idx = self.index
+            try:
+                url, info = self._source_for(idx)
+            except Exception:
+                url, info = None, None
+            reason = self._incompatible(info) if url else None
+            if reason:
+                if self.items[idx][1] not in self._reported:
+                    self._reported.add(self.items[idx][1])
+                    self.notify(f"⏭ 跳过 {self.items[idx][0]}: {reason}")
+                with self._lock:
+                    if idx == self.index: self.index += 1
+                    # 整个队列都无法播放时停止，避免循环空转
+                    if self.video_codec is None and self.index >= len(self.items): break
+                continue
+            started = time.monotonic()
+            self._skipped = False
+            code = None
+            if url:
+                self.video_codec = self.video_codec or info['video']
+                self.reader = subprocess.Popen(self._reader_cmd(url, info, offset), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                               stdin=subprocess.DEVNULL)
+                threading.Thread(target=self._prefetch, args=(idx + 1,), daemon=True).start()
+                broken = False
+                try:
+                    for chunk in iter(lambda: self.reader.stdout.read(65536), b''):
+                        encoder.stdin.write(chunk)
+                except (BrokenPipeError, OSError, ValueError):
+                    broken = True
+                self._kill_reader()
+                code = self.reader.wait()
+                self.reader.stdout.close()
+                if broken:
+                    # 编码进程退出，等待监管线程重启后重播当前文件
+                    self.stop_event.wait(1)
+                    continue
+            offset += time.monotonic() - started
+            with self._lock:
+                if idx == self.index: self.index += 1
+            # 直链获取失败或读取进程报错时退避，避免整个队列不可用时空转
+            if code != 0 and not self._skipped:
+                quick_failures += 1
+                self.stop_event.wait(min(30, 2 ** quick_failures))
+            else:
+                quick_failures = 0
+        if self.stop_event.is_set(): return
+        try: self.process.stdin.close()
+        except Exception: pass
+
+class StreamGovernor:
+    # 根据状态采样快照判断设备压力: 持续过热/高负载/低电量时降档重启推流，冷却后逐级恢复
+    def __init__(self, sustain=3, cool=12, hold=120, settle=60):
+        self.sustain = sustain  # 连续多少次高压力采样后降档
+        self.cool = cool        # 连续多少次低压力采样后升档
+        self.hold = hold        # 两次调整之间的最短间隔 (秒)
+        self.settle = settle    # ffmpeg (重新) 启动后多久才把推流变慢算作压力 (秒)
+        self.hot = 0
+        self.calm = 0
+        self.last_change = 0
+
+    def evaluate(self, snap):
+        session = StreamManager.session
+        if not session or not session.governable or session.state != 'running':
+            self.hot = self.calm = 0
+            return None
+        temp, cpu = snap.get('temp_c'), snap.get('cpu') or 0
+        battery = snap.get('battery_pct')
+        discharging = str(snap.get('battery_status') or '').upper() != 'CHARGING'
+        low_battery = battery is not None and battery <= GOVERNOR_BATTERY_LOW and discharging
+        # 每次降档/重启都会重新启动 ffmpeg，刚启动时的速度不代表新档位的负载
+        settled = time.monotonic() - (session.started_at or 0) >= self.settle
+        slow = settled and session.stats.slow_for() > 30
+        hot = (temp is not None and temp >= GOVERNOR_TEMP_HIGH) or cpu >= GOVERNOR_CPU_HIGH or low_battery or slow
+        calm = (temp is None or temp < GOVERNOR_TEMP_LOW) and cpu < GOVERNOR_CPU_LOW and not low_battery and not slow
+        self.hot = self.hot + 1 if hot else 0
+        self.calm = self.calm + 1 if calm else 0
+        if time.monotonic() - self.last_change < self.hold: return None
+        reason = (f"温度 {f'{temp}°C' if temp is not None else 'N/A'}, CPU {cpu}%, "
+                  f"电量 {f'{battery}%' if battery is not None else 'N/A'}")
+        if self.hot >= self.sustain and session.profile < len(STREAM_PROFILES) - 1:
+            return self._apply(session, session.profile + 1, f"🔥 设备压力过高 ({reason})，推流降档")
+        if self.calm >= self.cool and session.profile > 0:
+            return self._apply(session, session.profile - 1, f"❄️ 设备已降温 ({reason})，推流升档")
+        return None
+
+    def _apply(self, session, profile, text):
+        session.set_profile(profile)
+        self.hot = self.calm = 0
+        self.last_change = time.monotonic()
+        return f"{text}至 {STREAM_PROFILES[profile]['name']}"
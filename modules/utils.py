@@ -1,15 +1,22 @@
 import subprocess
 import time
+import heapq
 import datetime
+import threading
+import re
+import socket
 import psutil
 import json
 import requests
-from modules.config import PING_TARGET
+from modules.config import PING_TARGET, STATUS_INTERVALS
 
 # Note: start_time will be handled in bot.py and passed or imported
 # For now, let's define a way to get it
 START_TIME = time.time()
 
+def escape_md(text):
+    return str(text).replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[').replace(']', '\\]')
+
 class SystemUtils:
     @staticmethod
     def run_cmd(cmd, timeout=30):
@@ -25,41 +32,172 @@ class SystemUtils:
     @staticmethod
     def get_status_msg(start_time):
         uptime = str(datetime.timedelta(seconds=int(time.time() - start_time)))
-        cpu = psutil.cpu_percent(interval=0.5)
-        mem = psutil.virtual_memory().percent
-        disk = psutil.disk_usage('/').percent
-        
-        lan_ip = NetworkUtils.get_lan_ip()
-        
-        temp = "N/A"
-        try:
-            temp = SystemUtils.run_cmd("sensors | grep 'temp1' | head -1")
-            if not temp: temp = "N/A"
-        except: pass
-        
-        battery = "N/A"
-        try:
-            bat_info = json.loads(SystemUtils.run_cmd("termux-battery-status"))
-            battery = f"{bat_info.get('percentage', 'N/A')}% ({bat_info.get('status', 'N/A')})"
-        except: pass
-        
+        snap = status_sampler.snapshot()
         return (f"📊 **Termux 全功能控制台**\n"
                 f"━━━━━━━━━━━━━━━━\n"
                 f"⏱ 运行时间: `{uptime}`\n"
-                f"💻 CPU负载: `{cpu}%`\n"
-                f"🧠 内存使用: `{mem}%`\n"
-                f"💾 存储使用: `{disk}%`\n"
-                f"🌐 内网 IP: `{lan_ip}`\n"
-                f"🔋 电池状态: `{battery}`\n"
-                f"🌡 设备温度: `{temp}`")
+                f"💻 CPU负载: `{snap['cpu']}%`\n"
+                f"🧠 内存使用: `{snap['mem']}%`\n"
+                f"💾 存储使用: `{snap['disk']}%`\n"
+                f"🌐 内网 IP: `{snap['lan_ip']}`\n"
+                f"🔋 电池状态: `{snap['battery']}`\n"
+                f"🌡 设备温度: `{snap['temp']}`")
+
+class StatusSampler:
+    # 后台线程按各指标的间隔刷新快照，get_status_msg 只读取快照不做任何 I/O
+    def __init__(self, intervals):
+        self.intervals = dict(intervals)
+        self._snap = {'cpu': 0.0, 'mem': 0.0, 'disk': 0.0, 'lan_ip': '127.0.0.1',
+                      'temp': 'N/A', 'temp_c': None, 'battery': 'N/A',
+                      'battery_pct': None, 'battery_status': None, 'updated': {}}
+        self._started = False
+        self._lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._started: return
+            self._started = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def snapshot(self):
+        if not self._started: self.start()
+        return self._snap
+
+    def _run(self):
+        psutil.cpu_percent(interval=None)  # 建立 CPU 基准
+        due = {name: 0 for name in self.intervals}
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for name, at in due.items():
+                if at > now: continue
+                try:
+                    self._sample(name)
+                except Exception:
+                    pass
+                due[name] = now + self.intervals[name]
+            self.stop_event.wait(max(0.1, min(due.values()) - time.monotonic()))
+
+    def _sample(self, name):
+        # 构造新快照再整体替换，读取方无需加锁
+        snap = dict(self._snap)
+        if name == 'cpu':
+            snap['cpu'] = psutil.cpu_percent(interval=None)
+        elif name == 'mem':
+            snap['mem'] = psutil.virtual_memory().percent
+        elif name == 'disk':
+            snap['disk'] = psutil.disk_usage('/').percent
+        elif name == 'lan_ip':
+            snap['lan_ip'] = NetworkUtils.get_lan_ip()
+        elif name == 'temp':
+            out = SystemUtils.run_cmd("sensors", timeout=5)
+            line = next((l for l in out.splitlines() if 'temp1' in l), '')
+            m = re.search(r'([-+]?\d+(?:\.\d+)?)\s*°?C', line)
+            snap['sensor_temp'] = float(m.group(1)) if m else None
+            snap['sensor_line'] = line.strip()
+        elif name == 'battery':
+            try:
+                bat_info = json.loads(SystemUtils.run_cmd("termux-battery-status", timeout=5))
+                snap['battery_pct'] = bat_info.get('percentage')
+                snap['battery_status'] = bat_info.get('status')
+                snap['battery_temp'] = bat_info.get('temperature')
+                snap['battery'] = f"{bat_info.get('percentage', 'N/A')}% ({bat_info.get('status', 'N/A')})"
+            except ValueError:
+                pass
+        # 没有 sensors 时退回电池温度
+        if snap.get('sensor_temp') is not None:
+            snap['temp_c'] = snap['sensor_temp']
+            snap['temp'] = f"{snap['temp_c']}°C"
+        elif snap.get('battery_temp') is not None:
+            snap['temp_c'] = float(snap['battery_temp'])
+            snap['temp'] = f"{snap['temp_c']}°C (电池)"
+        else:
+            snap['temp_c'] = None
+            snap['temp'] = snap.get('sensor_line') or "N/A"
+        snap['updated'] = dict(snap['updated'], **{name: time.time()})
+        self._snap = snap
+
+class ProcessSampler:
+    # 进程 Top 视图: 保存上次采样的 CPU 时间/IO 计数，用差值计算 CPU% 与 IO 速率，结果短时缓存
+    SORT_KEYS = {
+        'cpu': lambda r: r['cpu'] or 0,
+        'mem': lambda r: r['mem'],
+        'io': lambda r: r['io'] or 0,
+    }
+
+    def __init__(self, ttl=3, top_n=10):
+        self.ttl = ttl
+        self.top_n = top_n
+        self._prev = {}  # pid -> (create_time, cpu_seconds, io_bytes, sampled_at)
+        self._rows = []
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def top(self, sort='cpu'):
+        key = self.SORT_KEYS.get(sort, self.SORT_KEYS['cpu'])
+        with self._lock:
+            if time.monotonic() >= self._expires:
+                if not self._prev:
+                    # 首次调用没有基准，短暂间隔后再采一次才能得到 CPU%
+                    self._sample()
+                    time.sleep(0.3)
+                self._rows = self._sample()
+                self._expires = time.monotonic() + self.ttl
+            rows = self._rows
+        return heapq.nlargest(self.top_n, rows, key=key)
+
+    def _sample(self):
+        now = time.monotonic()
+        prev, current, rows = self._prev, {}, []
+        for p in psutil.process_iter():
+            try:
+                with p.oneshot():
+                    created = p.create_time()
+                    times = p.cpu_times()
+                    mem = p.memory_percent()
+                    name = p.name()
+                    try:
+                        io = p.io_counters()
+                        io_bytes = io.read_bytes + io.write_bytes
+                    except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                        io_bytes = None
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            cpu_seconds = times.user + times.system
+            current[p.pid] = (created, cpu_seconds, io_bytes, now)
+            cpu = io_rate = None
+            last = prev.get(p.pid)
+            if last and last[0] == created and now > last[3]:
+                elapsed = now - last[3]
+                cpu = max(0.0, (cpu_seconds - last[1]) / elapsed * 100)
+                if io_bytes is not None and last[2] is not None:
+                    io_rate = max(0.0, (io_bytes - last[2]) / elapsed)
+            rows.append({'pid': p.pid, 'name': name, 'cpu': cpu, 'mem': mem, 'io': io_rate})
+        self._prev = current  # 只保留存活进程的状态
+        return rows
+
+    @staticmethod
+    def format_rows(rows, sort):
+        titles = {'cpu': "CPU", 'mem': "内存", 'io': "IO"}
+        msg = f"⚙️ **Top 进程 ({titles.get(sort, 'CPU')})**\n\n"
+        for r in rows:
+            cpu = f"{r['cpu']:.1f}%" if r['cpu'] is not None else "-"
+            io = f" | IO {r['io'] / 1024:.0f}KB/s" if r['io'] is not None else ""
+            msg += f"`{r['pid']}` | {escape_md(r['name'])} | CPU {cpu} | 内存 {r['mem']:.1f}%{io}\n"
+        return msg
 
 class NetworkUtils:
     @staticmethod
-    def check_internet():
+    def check_internet(timeout=2):
+        # TCP 连接 DNS 服务器的 53 端口，不需要 fork ping 进程
         try:
-            subprocess.check_call(['ping', '-c', '1', '-W', '2', PING_TARGET], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            socket.create_connection((PING_TARGET, 53), timeout=timeout).close()
             return True
-        except: return False
+        except OSError: return False
 
     @staticmethod
     def get_wifi_info():
@@ -84,7 +222,6 @@ class NetworkUtils:
     @staticmethod
     def get_lan_ip():
         try:
-            import socket
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect(("8.8.8.8", 80))
             ip = s.getsockname()[0]
@@ -92,3 +229,6 @@ class NetworkUtils:
             return ip
         except:
             return "127.0.0.1"
+
+status_sampler = StatusSampler(STATUS_INTERVALS)
+process_sampler = ProcessSampler()
@@ -0,0 +1,160 @@
+import sys
+import hmac
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot import types
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY = 1024 * 1024
+
+class WebhookServer:
+    # 本地 HTTP 服务接收 Telegram 推送的更新 (可放在反向代理/隧道之后)，交给 bot.process_new_updates 分发
+    def __init__(self, bot, host, port, secret):
+        self.bot = bot
+        self.secret = secret
+        self.received = 0
+        self.rejected = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                # 只接受带正确 secret_token 的请求
+                if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), server.secret):
+                    server.rejected += 1
+                    return self._reply(403)
+                length = int(self.headers.get('Content-Length') or 0)
+                if length <= 0 or length > MAX_BODY:
+                    return self._reply(413 if length else 400)
+                try:
+                    update = types.Update.de_json(self.rfile.read(length).decode('utf-8'))
+                except Exception:
+                    return self._reply(400)
+                server.received += 1
+                # 先回复 200，避免处理耗时导致 Telegram 重发
+                self._reply(200)
+                try:
+                    server.bot.process_new_updates([update])
+                except Exception as e:
+                    print(f"Webhook update error: {e}")
+
+            def do_GET(self):
+                self._reply(200, b'ok')
+
+            def _reply(self, code, body=b''):
+                self.send_response(code)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True, name='webhook').start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def run_webhook(bot, url, host, port, secret, allowed_updates=None, check_interval=60, max_failures=3, local=False):
+    # 以 webhook 模式运行并定期检查投递状态；返回 False 表示不可用，调用方应回退到长轮询
+    # local=True 时不调用 set_webhook/getWebhookInfo，只接收本地模拟发送的更新
+    try:
+        server = WebhookServer(bot, host, port, secret).start()
+    except OSError as e:
+        print(f"Webhook server failed to bind {host}:{port}: {e}")
+        return False
+    if local:
+        print(f"Webhook local mode: http://{host}:{port} (not registered with Telegram)")
+        threading.Event().wait()
+    try:
+        bot.set_webhook(url=url, secret_token=secret, allowed_updates=allowed_updates, drop_pending_updates=True)
+    except Exception as e:
+        print(f"set_webhook failed: {e}")
+        server.stop()
+        return False
+    print(f"Webhook mode: {url} -> http://{host}:{port}")
+    last_error, failures = int(time.time()), 0
+    while True:
+        time.sleep(check_interval)
+        try:
+            info = bot.get_webhook_info()
+        except Exception as e:
+            print(f"get_webhook_info failed: {e}")
+            continue
+        if info.url != url:
+            # webhook 被外部删除或替换，重新注册
+            try: bot.set_webhook(url=url, secret_token=secret, allowed_updates=allowed_updates)
+            except Exception as e: print(f"set_webhook failed: {e}")
+            continue
+        # Telegram 持续投递失败 (隧道断开、代理配置错误等) 且有积压更新时回退
+        if info.last_error_date and info.last_error_date > last_error and info.pending_update_count:
+            failures += 1
+            last_error = info.last_error_date
+            print(f"Webhook delivery error ({failures}/{max_failures}): {info.last_error_message}")
+        else:
+            failures = 0
+        if failures >= max_failures:
+            print("Webhook unhealthy, falling back to polling.")
+            try: bot.remove_webhook()
+            except Exception: pass
+            server.stop()
+            return False
+
+# --- 本地模拟 Telegram 推送，用于离线测试 webhook 模式 ---
+def fake_update(chat_id, text=None, callback_data=None, update_id=None):
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Tester'}
+    message = {'message_id': random.randint(1, 1 << 30), 'date': int(time.time()),
+               'chat': {'id': chat_id, 'type': 'private'}, 'from': user, 'text': text or ''}
+    if text and text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    update = {'update_id': update_id or random.randint(1, 1 << 30)}
+    if callback_data is not None:
+        update['callback_query'] = {'id': str(random.randint(1, 1 << 30)), 'from': user, 'chat_instance': '0',
+                                    'data': callback_data, 'message': message}
+    else:
+        update['message'] = message
+    return update
+
+def send_fake_update(url, secret, update):
+    req = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'), method='POST',
+                                 headers={'Content-Type': 'application/json', SECRET_HEADER: secret})
+    # 返回 HTTP 状态码；无法连接时返回 None
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError) as e:
+        print(f"{url} -> 连接失败: {getattr(e, 'reason', e)} (bot 是否以 webhook 模式运行?)")
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="向本地 webhook 服务发送模拟的 Telegram 更新")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--text', help="消息文本，例如 /status")
+    group.add_argument('--callback', help="按钮 callback_data，例如 menu_proc")
+    parser.add_argument('--chat-id', type=int, help="默认使用 ADMIN_ID")
+    parser.add_argument('--url', help="默认 http://127.0.0.1:<WEBHOOK_PORT>/")
+    parser.add_argument('--secret', help="默认使用 WEBHOOK_SECRET")
+    args = parser.parse_args(argv)
+    from modules.config import ADMIN_ID, WEBHOOK_PORT, WEBHOOK_SECRET
+    url = args.url or f"http://127.0.0.1:{WEBHOOK_PORT}/"
+    update = fake_update(args.chat_id or ADMIN_ID, text=args.text, callback_data=args.callback)
+    status = send_fake_update(url, args.secret or WEBHOOK_SECRET, update)
+    if status is None: return 1
+    print(f"{url} -> HTTP {status}")
+    return 0 if status == 200 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())